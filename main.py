@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 from src.voice_recorder import VoiceRecorder
 from src.transcriber import Transcriber
 from src.minutes_generator import MinutesGenerator
-from src.llm_providers import create_llm_provider
+from src.llm_providers import create_llm_provider, reap_stale_temp_files
 from src.context_manager import DiscordContextManager
 from src.speaker_analyzer import SpeakerAnalyzer
 from src.keyword_extractor import KeywordExtractor
@@ -75,6 +75,21 @@ minutes_generator = MinutesGenerator(minutes_provider)
 recording_status = {}
 
 
+def minutes_progress(processing_msg):
+    """議事録生成の進捗を処理中メッセージに反映するコールバックを作成"""
+
+    async def callback(partial: str):
+        await processing_msg.edit(
+            content=f"📄 議事録を生成しています... ({len(partial)}文字)"
+        )
+
+    return callback
+
+
+# 一時作業ディレクトリの定期削除タスク
+temp_reaper_task = None
+
+
 @bot.event
 async def on_ready():
     logger.info(f"{bot.user} がログインしました")
@@ -91,6 +106,11 @@ async def on_ready():
     logger.info(f"文字起こし用プロバイダー: {transcription_provider.provider_name}")
     logger.info(f"議事録生成用プロバイダー: {minutes_provider.provider_name}")
 
+    # 文字起こしの一時作業ディレクトリの定期削除を開始（再接続時の重複起動は避ける）
+    global temp_reaper_task
+    if temp_reaper_task is None or temp_reaper_task.done():
+        temp_reaper_task = asyncio.create_task(reap_stale_temp_files())
+
     # 古い録音ファイルをクリーンアップ
     try:
         voice_recorder.cleanup_old_recordings(max_age_days)
@@ -209,7 +229,9 @@ async def stop_recording(ctx):
 
         # 議事録生成
         await processing_msg.edit(content="📄 議事録を生成しています...")
-        minutes = await minutes_generator.generate(transcription)
+        minutes = await minutes_generator.generate(
+            transcription, progress_callback=minutes_progress(processing_msg)
+        )
 
         # セッション情報を取得
         session_summary = context_manager.get_session_summary(guild_id)
@@ -307,20 +329,25 @@ async def stop_recording_with_analysis(ctx):
         file_size_mb = file_path.stat().st_size / (1024 * 1024)
         logger.info(f"音声ファイルサイズ: {file_size_mb:.2f}MB")
 
-        # 文字起こし
+        # 文字起こし（話者の割り当てに使うためタイムスタンプ付きで取得）
         await processing_msg.edit(content="📝 音声を文字起こししています...")
-        transcription = await transcriber.transcribe(audio_file, guild_id=guild_id)
+        timed_transcription = await transcriber.transcribe_with_timestamps(
+            audio_file, guild_id=guild_id
+        )
+        transcription = timed_transcription["text"]
 
-        if transcription.startswith("音声の文字起こしで"):
+        # 失敗時は本文にエラーメッセージが入り、セグメントは空になる
+        if not timed_transcription["segments"]:
             await processing_msg.edit(
                 content=f"❌ 文字起こしに失敗しました: {transcription}"
             )
             return
 
-        # 話者分析
+        # 話者分析（Whisperのセグメントと発言区間の重なりで話者を割り当てる）
         await processing_msg.edit(content="👥 話者分析を実行中...")
         speaker_segments, statistics = await speaker_analyzer.analyze_recording_with_speakers(
-            voice_recorder.sink, participants, transcription
+            voice_recorder.sink, participants, transcription,
+            transcript_segments=timed_transcription["segments"]
         )
 
         # キーワード・アクション抽出
@@ -337,7 +364,9 @@ async def stop_recording_with_analysis(ctx):
 
         # 議事録生成
         await processing_msg.edit(content="📄 議事録を生成しています...")
-        minutes = await minutes_generator.generate(transcription)
+        minutes = await minutes_generator.generate(
+            transcription, progress_callback=minutes_progress(processing_msg)
+        )
 
         # 結果送信
         await processing_msg.edit(content="✅ 処理完了！結果を送信します...")
@@ -457,7 +486,9 @@ async def stop_recording_both(ctx):
 
         # 議事録生成
         await processing_msg.edit(content="📄 議事録を生成しています...")
-        minutes = await minutes_generator.generate(transcription)
+        minutes = await minutes_generator.generate(
+            transcription, progress_callback=minutes_progress(processing_msg)
+        )
 
         # 文字起こし結果を送信
         await processing_msg.edit(
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from openai import OpenAIError
+
+from .llm_dispatcher import RETRYABLE_ERRORS
+from .llm_providers import OpenAIProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# バッチで呼び出すエンドポイント
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# バッチの終了状態
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _dump_jsonl(records: List[dict]) -> bytes:
+    """JSONLを作成（文字起こし全文を含む大きな本文になるため orjson があれば使う）"""
+    if orjson is not None:
+        return b"\n".join(orjson.dumps(record) for record in records)
+    return "\n".join(
+        json.dumps(record, ensure_ascii=False) for record in records
+    ).encode("utf-8")
+
+
+def _load_json(line: str) -> dict:
+    """JSONLの1行を解析"""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+class BatchOpenAIProvider(OpenAIProvider):
+    """OpenAI Batch API プロバイダー（アーカイブ済み録音の一括議事録生成など、即時性が不要な処理向け）
+
+    チャット生成は一定時間キューに溜めてから1つのバッチとして投入し、完了後に結果を返す。
+    文字起こしはBatch API非対応のため OpenAIProvider と同様に即時実行する。
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        super().__init__(api_key)
+        # 最初のリクエストからバッチ投入までの待ち時間（この間のリクエストをまとめる）
+        self.batch_window = float(os.getenv("OPENAI_BATCH_WINDOW", "5"))
+        # バッチの状態確認間隔（秒）
+        self.poll_interval = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+        self._pending: List[Tuple[str, dict, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def generate_chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 2000,
+        temperature: float = 0.3,
+    ) -> AsyncIterator[str]:
+        """バッチはストリーミング非対応のため完了後に一括で返す"""
+        yield await self._complete(messages, max_tokens, temperature)
+
+    async def _request_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> str:
+        """リクエストをキューに追加し、バッチ完了まで待機"""
+        body = {
+            "model": self.chat_model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((f"request-{uuid.uuid4().hex}", body, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+        return await future
+
+    async def _flush_later(self) -> None:
+        """待ち時間の経過後にキューを投入"""
+        await asyncio.sleep(self.batch_window)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """キュー中のリクエストをバッチとして投入し、結果を各呼び出し元へ返す"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        try:
+            results = await self._run_batch([(cid, body) for cid, body, _ in pending])
+        except Exception as e:
+            logger.error(f"バッチ処理エラー: {e}")
+            results = {}
+            for custom_id, _, _ in pending:
+                results[custom_id] = e
+
+        for custom_id, _, future in pending:
+            if future.done():
+                # 呼び出し元がキャンセル済み
+                continue
+            result = results.get(custom_id)
+            if result is None:
+                result = OpenAIError(f"バッチ結果に応答がありません: {custom_id}")
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(
+        self, requests: List[Tuple[str, dict]]
+    ) -> Dict[str, Union[str, Exception]]:
+        """JSONLをアップロードしてバッチを作成し、完了までポーリングして結果を取得"""
+        lines = _dump_jsonl(
+            [
+                {
+                    "custom_id": cid,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": body,
+                }
+                for cid, body in requests
+            ]
+        )
+
+        # SDK側の再試行は無効なため、一時的なエラーはディスパッチャーで再試行する
+        client, dispatcher = self._next_client()
+        input_file = await dispatcher.submit(
+            lambda: client.files.create(file=("requests.jsonl", lines), purpose="batch")
+        )
+        batch = await dispatcher.submit(
+            lambda: client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window="24h",
+            )
+        )
+        batch_id = batch.id
+        logger.info(f"バッチを投入しました: {batch_id} ({len(requests)}件)")
+
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                batch = await dispatcher.submit(
+                    lambda: client.batches.retrieve(batch_id)
+                )
+            except RETRYABLE_ERRORS as e:
+                # バッチはサーバー側で処理が続くため、同じIDで次回の確認から再開する
+                logger.warning(f"バッチの状態確認に失敗しました（継続）: {batch_id} {e}")
+
+        if batch.status == "failed":
+            raise OpenAIError(f"バッチ処理が失敗しました: {batch.id} {batch.errors}")
+        logger.info(f"バッチが終了しました: {batch.id} ({batch.status})")
+
+        # 期限切れ・キャンセル時も処理済みの分は出力ファイルから取得できる
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await dispatcher.submit(
+                lambda file_id=file_id: client.files.content(file_id)
+            )
+            for line in content.text.splitlines():
+                if line.strip():
+                    record = _load_json(line)
+                    results[record["custom_id"]] = self._parse_batch_record(record)
+        return results
+
+    @staticmethod
+    def _parse_batch_record(record: dict) -> Union[str, Exception]:
+        """バッチ出力の1行から本文またはエラーを取り出す"""
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or body.get("error") or response
+            return OpenAIError(f"バッチ内のリクエストが失敗しました: {error}")
+        return (body["choices"][0]["message"]["content"] or "").strip()
+
+    @property
+    def provider_name(self) -> str:
+        return "OpenAI Batch"
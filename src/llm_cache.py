@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "~/.discord_v2t/llm_cache.sqlite3"
+
+
+def make_cache_key(**parts: Any) -> str:
+    """リクエスト内容からキャッシュキーを生成"""
+    if orjson is not None:
+        payload = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    else:
+        payload = json.dumps(
+            parts, ensure_ascii=False, sort_keys=True, default=str
+        ).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=32).hexdigest()
+
+
+def dump_cache_value(value: Any) -> str:
+    """キャッシュに保存する値をJSON文字列に変換"""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False)
+
+
+class LLMCache:
+    """SQLiteベースの永続キャッシュ（有効期限付き、件数上限を超えたら最終アクセスが古い順に削除）"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = 10000,
+        ttl_seconds: int = 7 * 86400,
+    ):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュを取得（期限切れは削除してNone）"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """キャッシュを保存し、上限を超えた分を削除"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+_caches: Dict[str, LLMCache] = {}
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """環境変数で有効化されている場合に共有キャッシュを返す"""
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() != "true":
+        return None
+
+    path = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if path not in _caches:
+        try:
+            _caches[path] = LLMCache(
+                path,
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+                ttl_seconds=int(os.getenv("LLM_CACHE_TTL_DAYS", "7")) * 86400,
+            )
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"LLMキャッシュを初期化できませんでした（無効化）: {e}")
+            return None
+    return _caches[path]
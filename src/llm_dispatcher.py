@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# 再試行対象のエラー（レート制限・接続エラー・サーバーエラー）
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    APIConnectionError,
+    InternalServerError,
+)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int = 0) -> int:
+    """メッセージの概算トークン数を見積もる（日本語は1文字≒1トークンとして保守的に計算）"""
+    return sum(len(m.get("content", "")) for m in messages) + max_tokens
+
+
+class _RateBucket:
+    """1分あたりの上限で補充されるトークンバケット"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.capacity / 60
+        )
+        self.updated = now
+
+    async def acquire(self, amount: int) -> None:
+        """必要量が溜まるまで待ってから消費"""
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) * 60 / self.capacity)
+
+
+class LLMDispatcher:
+    """RPM/TPM制限と同時実行数を守りつつLLM呼び出しを並行実行するディスパッチャー"""
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrent: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+    ):
+        self._requests = _RateBucket(rpm) if rpm > 0 else None
+        self._tokens = _RateBucket(tpm) if tpm > 0 else None
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # セマフォは実行中のイベントループ上で遅延生成する
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # レート制限エラー後は全リクエストをこの時刻まで待たせる
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LLMDispatcher":
+        """環境変数から設定を読み込んで作成"""
+        return cls(
+            rpm=int(os.getenv("LLM_RPM_LIMIT", "0")),
+            tpm=int(os.getenv("LLM_TPM_LIMIT", "0")),
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+
+    async def submit(
+        self, request: Callable[[], Awaitable[Any]], estimated_tokens: int = 0
+    ) -> Any:
+        """リクエストを制限内で実行（再試行のためコルーチンではなく生成関数を受け取る）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        attempt = 0
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            if self._requests:
+                await self._requests.acquire(1)
+            if self._tokens and estimated_tokens:
+                await self._tokens.acquire(estimated_tokens)
+
+            try:
+                async with self._semaphore:
+                    return await request()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_base * 2**attempt + random.random()
+                attempt += 1
+                if isinstance(e, RateLimitError):
+                    # 他の待機中リクエストも一緒に止めて429の連鎖を防ぐ
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+                logger.warning(
+                    f"LLM呼び出しを再試行します ({attempt}/{self.max_retries}, "
+                    f"{delay:.1f}秒後): {e}"
+                )
+                await asyncio.sleep(delay)
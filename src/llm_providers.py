@@ -1,10 +1,118 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, List
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Dict, List, Tuple
 import logging
 import asyncio
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+import time
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAIError
+
+from .llm_cache import dump_cache_value, get_llm_cache, make_cache_key
+from .llm_dispatcher import LLMDispatcher, estimate_tokens
+
+try:
+    from blake3 import blake3 as _file_hasher
+except ImportError:
+    _file_hasher = hashlib.blake2b
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# 分割文字起こしの結果の見出し（成功判定にも使用）
+SEGMENTED_RESULT_HEADER = "【分割音声の文字起こし結果】"
+
+# 文字起こし用の一時作業ディレクトリの接頭辞（定期削除の対象判定にも使用）
+WORKDIR_PREFIX = "whisper_"
+
+# 実行中の削除タスク（完了前にGCされないよう参照を保持）
+_cleanup_tasks = set()
+
+
+def _segment_to_dict(segment) -> dict:
+    """Whisperのセグメント（SDKのモデルまたは辞書）を保存用の辞書に変換"""
+    if isinstance(segment, dict):
+        return segment
+    return segment.model_dump()
+
+
+def _cleanup_temp_files(*paths) -> None:
+    """一時ファイル・ディレクトリをバックグラウンドのスレッドで削除"""
+
+    def _remove():
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(_remove))
+    _cleanup_tasks.add(task)
+    task.add_done_callback(_cleanup_tasks.discard)
+
+
+def _remove_stale_workdirs(max_age: float) -> int:
+    """削除漏れした古い一時作業ディレクトリを削除し、削除数を返す"""
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in Path(tempfile.gettempdir()).glob(f"{WORKDIR_PREFIX}*"):
+        try:
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+async def reap_stale_temp_files(max_age: float = 3600, interval: float = 600) -> None:
+    """古い一時作業ディレクトリを定期的に削除（起動時にタスクとして開始する）"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(_remove_stale_workdirs, max_age)
+            if removed:
+                logger.info(f"古い一時作業ディレクトリを削除しました: {removed}件")
+        except Exception as e:
+            logger.warning(f"一時作業ディレクトリの定期削除中にエラー: {e}")
+        await asyncio.sleep(interval)
+
+
+# 全プロバイダーで共有するHTTPクライアント（接続プール・keep-aliveを再利用する）
+_shared_http_client = None
+
+
+def _get_shared_http_client():
+    """OpenAI SDK用の共有HTTPクライアントを取得"""
+    global _shared_http_client
+    if _shared_http_client is None:
+        kwargs = {}
+        try:
+            import httpx
+
+            kwargs["limits"] = httpx.Limits(
+                max_connections=64, max_keepalive_connections=32, keepalive_expiry=60
+            )
+        except ImportError:
+            pass
+        try:
+            import h2  # noqa: F401
+
+            # h2 がインストールされていれば HTTP/2 で同時リクエストを1接続に多重化する
+            kwargs["http2"] = True
+        except ImportError:
+            pass
+        _shared_http_client = DefaultAsyncHttpxClient(**kwargs)
+    return _shared_http_client
+
 
 class LLMProvider(ABC):
     """LLMプロバイダーの基底クラス"""
@@ -45,10 +153,29 @@ class LLMProvider(ABC):
         messages: List[Dict[str, str]],
         max_tokens: int = 2000,
         temperature: float = 0.3,
+        json_mode: bool = False,
     ) -> str:
-        """チャット形式でのテキスト生成"""
+        """チャット形式でのテキスト生成（json_mode=TrueでJSONオブジェクトを出力させる）"""
         pass
 
+    async def generate_chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 2000,
+        temperature: float = 0.3,
+    ) -> AsyncIterator[str]:
+        """チャット形式でのテキスト生成を逐次返す（未対応のプロバイダーは一括で返す）"""
+        yield await self.generate_chat_completion(messages, max_tokens, temperature)
+
+    async def cache_stream_result(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        text: str,
+    ) -> None:
+        """呼び出し元が終端を検出して打ち切ったストリーミング生成の結果を保存（キャッシュ非対応なら何もしない）"""
+
     @abstractmethod
     def validate_api_key(self) -> bool:
         """APIキーの有効性をチェック"""
@@ -65,20 +192,42 @@ class OpenAIProvider(LLMProvider):
     """OpenAI APIプロバイダー"""
 
     def __init__(self, api_key: Optional[str] = None):
-        import os
-        from openai import AsyncOpenAI
-
-        self.client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        # OPENAI_API_KEYS（カンマ区切り）で複数キーを指定すると呼び出しを順番に振り分ける
+        api_keys = [
+            k.strip() for k in os.getenv("OPENAI_API_KEYS", "").split(",") if k.strip()
+        ]
+        if api_key or not api_keys:
+            api_keys = [api_key or os.getenv("OPENAI_API_KEY")]
+        # 再試行はディスパッチャーに任せる（SDK側でも再試行すると試行回数が掛け算になる）
+        self._clients = [
+            AsyncOpenAI(
+                api_key=key, http_client=_get_shared_http_client(), max_retries=0
+            )
+            for key in api_keys
+        ]
+        self.client = self._clients[0]
         # チャット生成に使用するモデル（精度向上のため上位モデルを既定に）
         # 例: gpt-4o, gpt-4o-mini, o3-mini（必要に応じて切替）
         self.chat_model = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o")
         self.context_manager = None  # コンテキストマネージャーは後から設定
+        # 同一音声の同時文字起こしを1回にまとめるための実行中タスク
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # チャット生成はレート制限・再試行付きのディスパッチャー経由で実行（キーごとに管理）
+        self._dispatchers = [LLMDispatcher.from_env() for _ in self._clients]
+        self._rotation = itertools.cycle(range(len(self._clients)))
+        # 同一リクエストの結果を再利用する永続キャッシュ（LLM_CACHE_ENABLED=true の場合のみ）
+        self.cache = get_llm_cache()
         super().__init__(self.client.api_key)
 
     def _validate_api_key(self) -> None:
         if not self.client.api_key:
             raise ValueError("OpenAI APIキーが設定されていません")
 
+    def _next_client(self) -> Tuple[AsyncOpenAI, LLMDispatcher]:
+        """ラウンドロビンで次のクライアントとそのディスパッチャーを取得"""
+        index = next(self._rotation)
+        return self._clients[index], self._dispatchers[index]
+
     def set_context_manager(self, context_manager):
         """コンテキストマネージャーを設定"""
         self.context_manager = context_manager
@@ -87,158 +236,214 @@ class OpenAIProvider(LLMProvider):
     async def transcribe(
         self, audio_file_path: str, language: str = "ja", guild_id: int = None
     ) -> str:
-        """音声ファイルを文字起こし"""
+        """音声ファイルを文字起こし（同一音声の同時リクエストは結果を共有）"""
         try:
-            from pathlib import Path
-            import openai
-            import os
+            key = await self._transcription_key(audio_file_path, language, guild_id)
+        except OSError:
+            # ハッシュを計算できない場合（ファイルなし等）は通常処理でエラーを返す
+            return await self._transcribe_file(audio_file_path, language, guild_id)
+
+        # 同じ音声を過去に文字起こし済みならキャッシュから返す
+        # （サーバーごとの文脈プロンプトが変わった場合は別の結果として扱う）
+        cache_key = None
+        if self.cache:
+            cache_key = make_cache_key(
+                whisper=key, params=self._get_whisper_parameters("discord", guild_id)
+            )
+        if cache_key:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info("文字起こしキャッシュにヒットしました")
+                return cached
+
+        return await self._share_inflight(
+            key,
+            lambda: self._transcribe_file(audio_file_path, language, guild_id, cache_key),
+        )
 
+    async def _share_inflight(self, key: str, start: Callable[[], Awaitable[Any]]) -> Any:
+        """同じキーの処理が実行中ならその結果を共有し、無ければ start() で開始する"""
+        task = self._inflight.get(key)
+        if task is None:
+            # 取得から登録まで await を挟まないため、イベントループ上でアトミック
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("同一音声の文字起こしが実行中のため、その結果を共有します")
+
+        # 呼び出し元がキャンセルされても共有中の処理は継続させる
+        return await asyncio.shield(task)
+
+    async def _transcription_key(
+        self, audio_file_path: str, language: str, guild_id: Optional[int]
+    ) -> str:
+        """音声ファイルの内容ハッシュから文字起こしのキーを生成"""
+
+        def _hash_file() -> str:
+            digest = _file_hasher()
+            with open(audio_file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()
+
+        file_hash = await asyncio.to_thread(_hash_file)
+        return f"{file_hash}:{language}:{guild_id}"
+
+    async def _transcribe_file(
+        self,
+        audio_file_path: str,
+        language: str = "ja",
+        guild_id: int = None,
+        cache_key: Optional[str] = None,
+    ) -> str:
+        """音声ファイルを文字起こし（実処理）"""
+        try:
             audio_file = Path(audio_file_path)
             if not audio_file.exists():
                 raise FileNotFoundError(
                     f"音声ファイルが見つかりません: {audio_file_path}"
                 )
 
-            # 音声前処理による品質向上
-            logger.info("音声前処理を実行します...")
-            enhanced_file = await self._enhance_audio_for_transcription(audio_file_path)
+            # 中間ファイル（前処理・圧縮・分割）は1つの一時ディレクトリにまとめ、
+            # 例外時も含めて結果を返した後にバックグラウンドで一括削除する
+            workdir = tempfile.mkdtemp(prefix=WORKDIR_PREFIX)
+            try:
+                return await self._transcribe_in_workdir(
+                    audio_file_path, language, guild_id, workdir, cache_key
+                )
+            finally:
+                _cleanup_temp_files(workdir)
 
-            if enhanced_file:
-                audio_file = Path(enhanced_file)
-                logger.info("音声前処理が完了しました")
-            else:
-                logger.warning("音声前処理に失敗しました。元ファイルを使用します")
-                audio_file = Path(audio_file_path)
+        except OpenAIError as e:
+            logger.error(f"OpenAI API エラー: {e}")
+            return f"音声の文字起こしでAPIエラーが発生しました: {str(e)}"
+        except FileNotFoundError as e:
+            logger.error(f"ファイルエラー: {e}")
+            return "音声ファイルが見つかりませんでした。"
+        except Exception as e:
+            logger.error(f"文字起こしエラー: {e}")
+            return f"音声の文字起こし中に予期しないエラーが発生しました: {str(e)}"
+
+    async def _transcribe_in_workdir(
+        self,
+        audio_file_path: str,
+        language: str,
+        guild_id: Optional[int],
+        workdir: str,
+        cache_key: Optional[str] = None,
+    ) -> str:
+        """一時ディレクトリを使って文字起こしを実行"""
+        # 音声前処理による品質向上
+        logger.info("音声前処理を実行します...")
+        enhanced_file = await self._enhance_audio_for_transcription(
+            audio_file_path, workdir
+        )
+
+        if enhanced_file:
+            audio_file = Path(enhanced_file)
+            logger.info("音声前処理が完了しました")
+        else:
+            logger.warning("音声前処理に失敗しました。元ファイルを使用します")
+            audio_file = Path(audio_file_path)
+
+        # ファイルは1度だけ読み込み、サイズチェックとアップロードに使い回す
+        audio_bytes = await asyncio.to_thread(audio_file.read_bytes)
 
-            # ファイルサイズチェック（OpenAI Whisper API の制限: 25MB）
-            file_size = audio_file.stat().st_size
-            max_size = 25 * 1024 * 1024  # 25MB
+        # ファイルサイズチェック（OpenAI Whisper API の制限: 25MB）
+        file_size = len(audio_bytes)
+        max_size = 25 * 1024 * 1024  # 25MB
 
-            if file_size > max_size:
-                logger.warning(
-                    f"音声ファイルが大きすぎます: {file_size / (1024*1024):.2f}MB > 25MB"
+        if file_size > max_size:
+            logger.warning(
+                f"音声ファイルが大きすぎます: {file_size / (1024*1024):.2f}MB > 25MB"
+            )
+            # ファイル圧縮を試行
+            compressed_file = await self._compress_audio_file(audio_file_path, workdir)
+            if compressed_file:
+                audio_file = Path(compressed_file)
+                new_size = audio_file.stat().st_size
+                logger.info(
+                    f"音声ファイルを圧縮しました: {new_size / (1024*1024):.2f}MB"
                 )
-                # ファイル圧縮を試行
-                compressed_file = await self._compress_audio_file(audio_file_path)
-                if compressed_file:
-                    audio_file = Path(compressed_file)
-                    new_size = audio_file.stat().st_size
-                    logger.info(
-                        f"音声ファイルを圧縮しました: {new_size / (1024*1024):.2f}MB"
-                    )
 
-                    # 圧縮後もまだ大きい場合は分割処理
-                    if new_size > max_size:
-                        logger.info("圧縮後もサイズが大きいため、音声分割を実行します")
-                        # 圧縮ファイルを分割
-                        segments = await self._split_audio_file(
-                            compressed_file, target_size_mb=20
-                        )
-                        if segments:
-                            # 分割されたセグメントを文字起こし
-                            result = await self._transcribe_segments(segments, language)
-                            # 圧縮ファイルをクリーンアップ
-                            try:
-                                Path(compressed_file).unlink()
-                                logger.debug(
-                                    f"圧縮ファイルを削除しました: {compressed_file}"
-                                )
-                            except Exception as e:
-                                logger.warning(f"圧縮ファイル削除エラー: {e}")
-                            return result
-                        else:
-                            return f"音声ファイルが大きすぎます ({new_size / (1024*1024):.2f}MB > 25MB)。音声分割にも失敗しました。"
-                else:
-                    # 圧縮に失敗した場合、元ファイルを直接分割
-                    logger.info("圧縮に失敗したため、元ファイルを分割します")
+                # 圧縮後もまだ大きい場合は分割処理
+                if new_size > max_size:
+                    logger.info("圧縮後もサイズが大きいため、音声分割を実行します")
+                    # 圧縮ファイルを分割
                     segments = await self._split_audio_file(
-                        audio_file_path, target_size_mb=20
+                        compressed_file, workdir, target_size_mb=20
                     )
                     if segments:
-                        return await self._transcribe_segments(segments, language)
+                        # 分割されたセグメントを文字起こし
+                        result = await self._transcribe_segments(segments, language)
+                        if result.startswith(SEGMENTED_RESULT_HEADER):
+                            await self._store_transcription(cache_key, result)
+                        return result
                     else:
-                        return f"音声ファイルが大きすぎます ({file_size / (1024*1024):.2f}MB > 25MB)。圧縮と分割の両方に失敗しました。"
+                        return f"音声ファイルが大きすぎます ({new_size / (1024*1024):.2f}MB > 25MB)。音声分割にも失敗しました。"
 
-            logger.info(
-                f"音声ファイルを文字起こししています: {audio_file_path} ({file_size / (1024*1024):.2f}MB)"
-            )
+                audio_bytes = await asyncio.to_thread(audio_file.read_bytes)
+            else:
+                # 圧縮に失敗した場合、元ファイルを直接分割
+                logger.info("圧縮に失敗したため、元ファイルを分割します")
+                segments = await self._split_audio_file(
+                    audio_file_path, workdir, target_size_mb=20
+                )
+                if segments:
+                    result = await self._transcribe_segments(segments, language)
+                    if result.startswith(SEGMENTED_RESULT_HEADER):
+                        await self._store_transcription(cache_key, result)
+                    return result
+                else:
+                    return f"音声ファイルが大きすぎます ({file_size / (1024*1024):.2f}MB > 25MB)。圧縮と分割の両方に失敗しました。"
 
-            # 最適化されたWhisperパラメータを取得（コンテキスト情報を含む）
-            whisper_params = self._get_whisper_parameters("discord", guild_id)
-            whisper_params["language"] = language
+        logger.info(
+            f"音声ファイルを文字起こししています: {audio_file_path} ({file_size / (1024*1024):.2f}MB)"
+        )
 
-            # パフォーマンス監視
-            import time
+        # 最適化されたWhisperパラメータを取得（コンテキスト情報を含む）
+        whisper_params = self._get_whisper_parameters("discord", guild_id)
+        whisper_params["language"] = language
 
-            start_time = time.time()
+        # パフォーマンス監視
+        start_time = time.time()
 
-            with open(audio_file, "rb") as file:
-                transcription = await self.client.audio.transcriptions.create(
-                    file=file, **whisper_params
-                )
+        # 読み込み済みのバイト列をそのままアップロード（ファイル名で形式を判定させる）
+        # 429・5xx・接続エラーはディスパッチャーが読み込み済みのバイト列のまま再試行する
+        client, dispatcher = self._next_client()
+        transcription = await dispatcher.submit(
+            lambda: client.audio.transcriptions.create(
+                file=(audio_file.name, audio_bytes), **whisper_params
+            )
+        )
 
-            processing_time = time.time() - start_time
-            logger.info(f"Whisper処理時間: {processing_time:.2f}秒")
+        processing_time = time.time() - start_time
+        logger.info(f"Whisper処理時間: {processing_time:.2f}秒")
 
-            if isinstance(transcription, str):
-                result = transcription.strip()
-            else:
-                result = str(transcription).strip()
+        if isinstance(transcription, str):
+            result = transcription.strip()
+        else:
+            result = str(transcription).strip()
 
-            if not result:
-                logger.warning("文字起こし結果が空でした")
-                return "音声の文字起こしに失敗しました。"
-
-            logger.info(f"文字起こし完了。文字数: {len(result)}")
-
-            # 一時ファイルのクリーンアップ
-            # 前処理ファイル
-            if (
-                "enhanced_file" in locals()
-                and enhanced_file
-                and enhanced_file != audio_file_path
-            ):
-                try:
-                    Path(enhanced_file).unlink()
-                    logger.debug(f"前処理ファイルを削除しました: {enhanced_file}")
-                except Exception:
-                    pass
-
-            # 圧縮ファイル
-            if (
-                "compressed_file" in locals()
-                and compressed_file
-                and compressed_file != audio_file_path
-            ):
-                try:
-                    Path(compressed_file).unlink()
-                    logger.debug(f"圧縮ファイルを削除しました: {compressed_file}")
-                except Exception:
-                    pass
+        if not result:
+            logger.warning("文字起こし結果が空でした")
+            return "音声の文字起こしに失敗しました。"
 
-            return result
+        logger.info(f"文字起こし完了。文字数: {len(result)}")
+        await self._store_transcription(cache_key, result)
+        return result
 
-        except openai.OpenAIError as e:
-            logger.error(f"OpenAI API エラー: {e}")
-            return f"音声の文字起こしでAPIエラーが発生しました: {str(e)}"
-        except FileNotFoundError as e:
-            logger.error(f"ファイルエラー: {e}")
-            return "音声ファイルが見つかりませんでした。"
-        except Exception as e:
-            logger.error(f"文字起こしエラー: {e}")
-            return f"音声の文字起こし中に予期しないエラーが発生しました: {str(e)}"
+    async def _store_transcription(self, cache_key: Optional[str], result: str) -> None:
+        """成功した文字起こし結果をキャッシュに保存"""
+        if cache_key and self.cache:
+            await asyncio.to_thread(self.cache.set, cache_key, result)
 
-    async def _compress_audio_file(self, audio_file_path: str) -> str:
+    async def _compress_audio_file(self, audio_file_path: str, workdir: str) -> str:
         """音声ファイルを圧縮"""
         try:
-            import tempfile
-            from pathlib import Path
-
             input_path = Path(audio_file_path)
-
-            # 一時ファイル作成
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                output_path = temp_file.name
+            output_path = os.path.join(workdir, "compressed.mp3")
 
             # FFmpegで音声を圧縮（ビットレート下げる、サンプリングレート下げる）
             cmd = [
@@ -280,19 +485,11 @@ class OpenAIProvider(LLMProvider):
             logger.error(f"音声圧縮エラー: {e}")
             return None
 
-    async def _preprocess_audio_file(self, audio_file_path: str) -> str:
+    async def _preprocess_audio_file(self, audio_file_path: str, workdir: str) -> str:
         """音声ファイルを前処理して品質を向上"""
         try:
-            import tempfile
-            from pathlib import Path
-
             input_path = Path(audio_file_path)
-
-            # 一時ファイル作成
-            with tempfile.NamedTemporaryFile(
-                suffix="_preprocessed.wav", delete=False
-            ) as temp_file:
-                output_path = temp_file.name
+            output_path = os.path.join(workdir, "preprocessed.wav")
 
             # FFmpegで音声前処理
             cmd = [
@@ -336,13 +533,11 @@ class OpenAIProvider(LLMProvider):
             logger.error(f"音声前処理エラー: {e}")
             return None
 
-    async def _enhance_audio_for_transcription(self, audio_file_path: str) -> str:
+    async def _enhance_audio_for_transcription(
+        self, audio_file_path: str, workdir: str
+    ) -> str:
         """文字起こし精度向上のための音声品質向上処理"""
         try:
-            import tempfile
-            import os
-            from pathlib import Path
-
             # 環境変数での前処理設定
             enable_preprocessing = (
                 os.getenv("ENABLE_AUDIO_PREPROCESSING", "true").lower() == "true"
@@ -352,12 +547,7 @@ class OpenAIProvider(LLMProvider):
                 return None
 
             input_path = Path(audio_file_path)
-
-            # 一時ファイル作成
-            with tempfile.NamedTemporaryFile(
-                suffix="_enhanced.wav", delete=False
-            ) as temp_file:
-                output_path = temp_file.name
+            output_path = os.path.join(workdir, "enhanced.wav")
 
             # 前処理強度の設定
             preprocessing_level = os.getenv(
@@ -382,6 +572,13 @@ class OpenAIProvider(LLMProvider):
                     "deesser=i=0.15:m=0.15:f=5500:s=o,"  # 強い歯擦音除去
                     "compand=0.3,1:6:-70/-60,-20,0,0:0:0.2:0"  # コンプレッサー
                 )
+            elif preprocessing_level == "fast_fft":
+                # FFTベースの高速前処理（チェーンを短くしてフィルタ段数を削減）
+                audio_filter = (
+                    "afftdn=nf=-25,"  # FFTノイズ除去
+                    "loudnorm=I=-16:LRA=11:TP=-1.5,"  # ラウドネス正規化
+                    "highpass=f=80"  # ローカット
+                )
             else:
                 # 中程度の前処理（デフォルト）
                 audio_filter = (
@@ -392,11 +589,21 @@ class OpenAIProvider(LLMProvider):
                     "deesser=i=0.1:m=0.1:f=6000:s=o"  # 歯擦音除去
                 )
 
+            # フィルタ処理のスレッド数（全コアを利用）
+            filter_threads = str(os.cpu_count() or 1)
+
             # 高度な音声品質向上処理
             cmd = [
                 "ffmpeg",
+                # マルチスレッド設定
+                "-filter_threads",
+                filter_threads,
+                "-filter_complex_threads",
+                filter_threads,
                 "-i",
                 str(input_path),
+                "-threads",
+                "0",
                 # 複合フィルター
                 "-af",
                 audio_filter,
@@ -443,8 +650,6 @@ class OpenAIProvider(LLMProvider):
         self, audio_context: str = "discord", guild_id: int = None
     ) -> dict:
         """文脈に応じた最適化されたWhisperパラメータを取得"""
-        import os
-
         # 基本パラメータ
         params = {"model": "whisper-1", "language": "ja", "response_format": "text"}
 
@@ -464,10 +669,8 @@ class OpenAIProvider(LLMProvider):
             # 従来の静的プロンプト生成
             params["prompt"] = self._generate_fallback_prompt(audio_context)
 
-        # 温度パラメータの最適化（利用可能であれば）
-        temperature = float(os.getenv("WHISPER_TEMPERATURE", "0.0"))
-        if temperature > 0:
-            params["temperature"] = temperature
+        # 温度パラメータ（0.0を明示して貪欲デコードに固定し、出力を決定的にする）
+        params["temperature"] = float(os.getenv("WHISPER_TEMPERATURE", "0.0"))
 
         # レスポンス形式の設定
         response_format = os.getenv("WHISPER_RESPONSE_FORMAT", "text")
@@ -479,8 +682,6 @@ class OpenAIProvider(LLMProvider):
 
     def _generate_fallback_prompt(self, audio_context: str = "discord") -> str:
         """フォールバック用の静的プロンプト生成"""
-        import os
-
         if audio_context == "segment":
             return """これは長い会話の一部分です。
 前後の内容は参照できません。聞き取り不能・不明確な箇所は推測で補完せず、
@@ -501,8 +702,6 @@ class OpenAIProvider(LLMProvider):
         self, audio_context: str = "discord", guild_id: int = None
     ) -> dict:
         """タイムスタンプ付き文字起こし用の最適化パラメータ"""
-        import os
-
         params = self._get_whisper_parameters(audio_context, guild_id)
 
         # タイムスタンプ用の設定
@@ -520,16 +719,11 @@ class OpenAIProvider(LLMProvider):
         return params
 
     async def _split_audio_file(
-        self, audio_file_path: str, target_size_mb: int = 20
+        self, audio_file_path: str, workdir: str, target_size_mb: int = 20
     ) -> list:
         """音声ファイルを指定サイズ以下のセグメントに分割"""
         try:
-            import tempfile
-            import asyncio
-            from pathlib import Path
-
             input_path = Path(audio_file_path)
-            segments = []
 
             # 音声の長さを取得
             duration_cmd = [
@@ -567,62 +761,26 @@ class OpenAIProvider(LLMProvider):
                 f"推定分割数: {estimated_segments}, セグメント長: {segment_duration:.2f}秒"
             )
 
-            # セグメントごとに分割
-            for i in range(estimated_segments):
-                start_time = i * segment_duration
-
-                # 最後のセグメントは残り全部
-                if i == estimated_segments - 1:
-                    duration = total_duration - start_time
-                else:
-                    duration = segment_duration
-
-                # 一時ファイル作成
-                with tempfile.NamedTemporaryFile(
-                    suffix=f"_segment_{i}.mp3", delete=False
-                ) as temp_file:
-                    output_path = temp_file.name
-
-                # FFmpegでセグメント抽出
-                split_cmd = [
-                    "ffmpeg",
-                    "-i",
-                    str(input_path),
-                    "-ss",
-                    str(start_time),  # 開始時間
-                    "-t",
-                    str(duration),  # 長さ
-                    "-acodec",
-                    "copy",  # 音声コーデックはコピー（高速）
-                    "-y",  # 上書き確認なし
-                    output_path,
-                ]
-
-                logger.info(f"セグメント {i+1}/{estimated_segments} を作成中...")
-                process = await asyncio.create_subprocess_exec(
-                    *split_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
+            # セグメントごとに分割（FFmpegを並行実行）
+            results = await asyncio.gather(
+                *(
+                    self._extract_audio_segment(
+                        input_path,
+                        os.path.join(workdir, f"segment_{i}.mp3"),
+                        i * segment_duration,
+                        # 最後のセグメントは残り全部
+                        (
+                            total_duration - i * segment_duration
+                            if i == estimated_segments - 1
+                            else segment_duration
+                        ),
+                        i,
+                        estimated_segments,
+                    )
+                    for i in range(estimated_segments)
                 )
-
-                stdout, stderr = await process.communicate()
-
-                if process.returncode == 0:
-                    output_file = Path(output_path)
-                    if output_file.exists() and output_file.stat().st_size > 0:
-                        segments.append(
-                            {
-                                "file_path": output_path,
-                                "start_time": start_time,
-                                "duration": duration,
-                                "segment_index": i,
-                            }
-                        )
-                        logger.info(f"セグメント {i+1} 作成完了: {output_path}")
-                    else:
-                        logger.error(f"セグメント {i+1} の作成に失敗")
-                else:
-                    logger.error(f"セグメント {i+1} 分割エラー: {stderr.decode()}")
+            )
+            segments = [segment for segment in results if segment]
 
             logger.info(f"音声分割完了: {len(segments)}個のセグメント")
             return segments
@@ -631,27 +789,93 @@ class OpenAIProvider(LLMProvider):
             logger.error(f"音声分割エラー: {e}")
             return []
 
+    async def _extract_audio_segment(
+        self,
+        input_path: Path,
+        output_path: str,
+        start_time: float,
+        duration: float,
+        index: int,
+        total: int,
+    ) -> Optional[dict]:
+        """FFmpegで1セグメントを切り出し（失敗時はNone）"""
+        split_cmd = [
+            "ffmpeg",
+            "-i",
+            str(input_path),
+            "-ss",
+            str(start_time),  # 開始時間
+            "-t",
+            str(duration),  # 長さ
+            "-acodec",
+            "copy",  # 音声コーデックはコピー（高速）
+            "-y",  # 上書き確認なし
+            output_path,
+        ]
+
+        logger.info(f"セグメント {index+1}/{total} を作成中...")
+        process = await asyncio.create_subprocess_exec(
+            *split_cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            logger.error(f"セグメント {index+1} 分割エラー: {stderr.decode()}")
+            return None
+
+        output_file = Path(output_path)
+        if not output_file.exists() or output_file.stat().st_size == 0:
+            logger.error(f"セグメント {index+1} の作成に失敗")
+            return None
+
+        logger.info(f"セグメント {index+1} 作成完了: {output_path}")
+        return {
+            "file_path": output_path,
+            "start_time": start_time,
+            "duration": duration,
+            "segment_index": index,
+        }
+
+    async def _transcribe_segment_files(
+        self, segments: list, whisper_params: dict
+    ) -> list:
+        """各セグメントを並行して文字起こし（同時実行数・再試行はディスパッチャーに従う）"""
+
+        async def _transcribe(segment: dict):
+            logger.info(f"セグメント {segment['segment_index'] + 1} の文字起こし中...")
+            client, dispatcher = self._next_client()
+            # パスを渡すとSDKがワーカースレッドで読み込む（イベントループを塞がない）
+            return await dispatcher.submit(
+                lambda: client.audio.transcriptions.create(
+                    file=Path(segment["file_path"]), **whisper_params
+                )
+            )
+
+        results = await asyncio.gather(
+            *(_transcribe(segment) for segment in segments), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
     async def _transcribe_segments(self, segments: list, language: str = "ja") -> str:
-        """分割されたセグメントを順次文字起こしして統合"""
+        """分割されたセグメントを並行して文字起こしして統合"""
         try:
             transcriptions = []
 
-            for segment in segments:
-                segment_path = segment["file_path"]
+            # セグメントを個別に文字起こし（最適化パラメータ使用）
+            whisper_params = self._get_whisper_parameters("segment")
+            whisper_params["language"] = language
+            results = await self._transcribe_segment_files(segments, whisper_params)
+
+            for segment, transcription in zip(segments, results):
                 start_time = segment["start_time"]
                 segment_index = segment["segment_index"]
 
-                logger.info(f"セグメント {segment_index + 1} の文字起こし中...")
-
-                # セグメントを個別に文字起こし（最適化パラメータ使用）
-                whisper_params = self._get_whisper_parameters("segment")
-                whisper_params["language"] = language
-
-                with open(segment_path, "rb") as file:
-                    transcription = await self.client.audio.transcriptions.create(
-                        file=file, **whisper_params
-                    )
-
                 if isinstance(transcription, str):
                     result = transcription.strip()
                 else:
@@ -677,21 +901,15 @@ class OpenAIProvider(LLMProvider):
                         f"セグメント {segment_index + 1} の文字起こし結果が空でした"
                     )
 
-            # セグメントのクリーンアップ
-            for segment in segments:
-                try:
-                    Path(segment["file_path"]).unlink()
-                    logger.debug(f"セグメントファイルを削除: {segment['file_path']}")
-                except Exception as e:
-                    logger.warning(f"セグメントファイル削除エラー: {e}")
-
             if not transcriptions:
                 return "分割された音声セグメントの文字起こしに失敗しました。"
 
             # 結果を統合（タイムスタンプ付き）
-            combined_text = "【分割音声の文字起こし結果】\n\n"
-            for trans in transcriptions:
-                combined_text += f"{trans['time_label']} {trans['text']}\n\n"
+            parts = [
+                f"{trans['time_label']} {trans['text']}"
+                for trans in sorted(transcriptions, key=lambda t: t["segment_index"])
+            ]
+            combined_text = SEGMENTED_RESULT_HEADER + "\n\n" + "\n\n".join(parts)
 
             total_chars = sum(len(trans["text"]) for trans in transcriptions)
             logger.info(
@@ -702,12 +920,6 @@ class OpenAIProvider(LLMProvider):
 
         except Exception as e:
             logger.error(f"セグメント文字起こしエラー: {e}")
-            # エラー時もセグメントファイルをクリーンアップ
-            for segment in segments:
-                try:
-                    Path(segment["file_path"]).unlink()
-                except:
-                    pass
             return f"分割音声の文字起こし中にエラーが発生しました: {e}"
 
     async def _transcribe_segments_with_timestamps(
@@ -716,28 +928,19 @@ class OpenAIProvider(LLMProvider):
         """分割されたセグメントをタイムスタンプ付きで文字起こしして統合"""
         try:
             all_segments = []
-            combined_text = ""
+            text_parts = []
             total_duration = 0
 
-            for segment in segments:
-                segment_path = segment["file_path"]
+            # セグメントをタイムスタンプ付きで並行して文字起こし（最適化パラメータ使用）
+            whisper_params = self._get_whisper_timestamp_parameters("segment")
+            whisper_params["language"] = language
+            results = await self._transcribe_segment_files(segments, whisper_params)
+
+            for segment, transcription in zip(segments, results):
                 start_time_offset = segment["start_time"]
                 segment_index = segment["segment_index"]
                 segment_duration = segment["duration"]
 
-                logger.info(
-                    f"セグメント {segment_index + 1} のタイムスタンプ付き文字起こし中..."
-                )
-
-                # セグメントをタイムスタンプ付きで文字起こし（最適化パラメータ使用）
-                whisper_params = self._get_whisper_timestamp_parameters("segment")
-                whisper_params["language"] = language
-
-                with open(segment_path, "rb") as file:
-                    transcription = await self.client.audio.transcriptions.create(
-                        file=file, **whisper_params
-                    )
-
                 # 結果を処理
                 if hasattr(transcription, "text"):
                     segment_text = transcription.text.strip()
@@ -745,7 +948,7 @@ class OpenAIProvider(LLMProvider):
                     segment_text = str(transcription).strip()
 
                 if segment_text:
-                    combined_text += segment_text + "\n"
+                    text_parts.append(segment_text)
 
                 # セグメント情報を処理（タイムスタンプを全体の時間軸に調整）
                 if hasattr(transcription, "segments") and transcription.segments:
@@ -773,13 +976,7 @@ class OpenAIProvider(LLMProvider):
                     f"セグメント {segment_index + 1} 完了 ({len(segment_text)}文字)"
                 )
 
-            # セグメントのクリーンアップ
-            for segment in segments:
-                try:
-                    Path(segment["file_path"]).unlink()
-                    logger.debug(f"セグメントファイルを削除: {segment['file_path']}")
-                except Exception as e:
-                    logger.warning(f"セグメントファイル削除エラー: {e}")
+            combined_text = "\n".join(text_parts)
 
             if not combined_text.strip():
                 return {
@@ -803,12 +1000,6 @@ class OpenAIProvider(LLMProvider):
 
         except Exception as e:
             logger.error(f"セグメントタイムスタンプ付き文字起こしエラー: {e}")
-            # エラー時もセグメントファイルをクリーンアップ
-            for segment in segments:
-                try:
-                    Path(segment["file_path"]).unlink()
-                except:
-                    pass
             return {
                 "text": f"分割音声のタイムスタンプ付き文字起こし中にエラーが発生しました: {e}",
                 "segments": [],
@@ -817,82 +1008,129 @@ class OpenAIProvider(LLMProvider):
             }
 
     async def transcribe_with_timestamps(
-        self, audio_file_path: str, language: str = "ja"
+        self, audio_file_path: str, language: str = "ja", guild_id: int = None
     ) -> dict:
-        """タイムスタンプ付きで音声ファイルを文字起こし"""
+        """タイムスタンプ付きで音声ファイルを文字起こし（同一音声の同時リクエストは結果を共有）"""
         try:
-            from pathlib import Path
-            import openai
+            key = await self._transcription_key(audio_file_path, language, guild_id)
+        except OSError:
+            return await self._transcribe_file_with_timestamps(
+                audio_file_path, language, guild_id
+            )
+        # 全文のみの文字起こしとは結果の形式が異なるため別のキーにする
+        key = f"{key}:verbose_json"
+
+        cache_key = None
+        if self.cache:
+            cache_key = make_cache_key(
+                whisper=key,
+                params=self._get_whisper_timestamp_parameters("discord", guild_id),
+                response_format="verbose_json",
+            )
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info("タイムスタンプ付き文字起こしキャッシュにヒットしました")
+                return json_loads(cached)
+
+        return await self._share_inflight(
+            key,
+            lambda: self._transcribe_file_with_timestamps(
+                audio_file_path, language, guild_id, cache_key
+            ),
+        )
 
+    async def _transcribe_file_with_timestamps(
+        self,
+        audio_file_path: str,
+        language: str = "ja",
+        guild_id: int = None,
+        cache_key: Optional[str] = None,
+    ) -> dict:
+        """タイムスタンプ付きで音声ファイルを文字起こし（実処理、成功時のみキャッシュ）"""
+        try:
             audio_file = Path(audio_file_path)
             if not audio_file.exists():
                 raise FileNotFoundError(
                     f"音声ファイルが見つかりません: {audio_file_path}"
                 )
 
-            # 音声前処理による品質向上
-            logger.info("音声前処理を実行します...")
-            enhanced_file = await self._enhance_audio_for_transcription(audio_file_path)
+            # 中間ファイルは結果を返した後に一時ディレクトリごと削除する
+            workdir = tempfile.mkdtemp(prefix=WORKDIR_PREFIX)
+            try:
+                result = await self._transcribe_with_timestamps_in_workdir(
+                    audio_file_path, language, guild_id, workdir
+                )
+            finally:
+                _cleanup_temp_files(workdir)
 
-            if enhanced_file:
-                audio_file = Path(enhanced_file)
-                logger.info("音声前処理が完了しました")
-            else:
-                logger.warning("音声前処理に失敗しました。元ファイルを使用します")
-                audio_file = Path(audio_file_path)
+            # エラー時はセグメントが空になるため、セグメントがある結果のみ保存する
+            if cache_key and self.cache and result["segments"]:
+                value = dump_cache_value(
+                    {**result, "segments": [_segment_to_dict(s) for s in result["segments"]]}
+                )
+                await asyncio.to_thread(self.cache.set, cache_key, value)
+            return result
 
-            # ファイルサイズチェック
-            file_size = audio_file.stat().st_size
-            max_size = 25 * 1024 * 1024  # 25MB
+        except OpenAIError as e:
+            logger.error(f"OpenAI API エラー: {e}")
+            return {
+                "text": f"音声の文字起こしでAPIエラーが発生しました: {str(e)}",
+                "segments": [],
+                "language": language,
+                "duration": 0,
+            }
+        except Exception as e:
+            logger.error(f"タイムスタンプ付き文字起こしエラー: {e}")
+            return {
+                "text": f"音声の文字起こし中に予期しないエラーが発生しました: {str(e)}",
+                "segments": [],
+                "language": language,
+                "duration": 0,
+            }
 
-            compressed_file = None
-            if file_size > max_size:
-                logger.warning(
-                    f"音声ファイルが大きすぎます: {file_size / (1024*1024):.2f}MB > 25MB"
+    async def _transcribe_with_timestamps_in_workdir(
+        self, audio_file_path: str, language: str, guild_id: Optional[int], workdir: str
+    ) -> dict:
+        """一時ディレクトリを使ってタイムスタンプ付き文字起こしを実行"""
+        # 音声前処理による品質向上
+        logger.info("音声前処理を実行します...")
+        enhanced_file = await self._enhance_audio_for_transcription(
+            audio_file_path, workdir
+        )
+
+        if enhanced_file:
+            audio_file = Path(enhanced_file)
+            logger.info("音声前処理が完了しました")
+        else:
+            logger.warning("音声前処理に失敗しました。元ファイルを使用します")
+            audio_file = Path(audio_file_path)
+
+        # ファイルは1度だけ読み込み、サイズチェックとアップロードに使い回す
+        audio_bytes = await asyncio.to_thread(audio_file.read_bytes)
+
+        # ファイルサイズチェック
+        file_size = len(audio_bytes)
+        max_size = 25 * 1024 * 1024  # 25MB
+
+        if file_size > max_size:
+            logger.warning(
+                f"音声ファイルが大きすぎます: {file_size / (1024*1024):.2f}MB > 25MB"
+            )
+            compressed_file = await self._compress_audio_file(audio_file_path, workdir)
+            if compressed_file:
+                audio_file = Path(compressed_file)
+                new_size = audio_file.stat().st_size
+                logger.info(
+                    f"音声ファイルを圧縮しました: {new_size / (1024*1024):.2f}MB"
                 )
-                compressed_file = await self._compress_audio_file(audio_file_path)
-                if compressed_file:
-                    audio_file = Path(compressed_file)
-                    new_size = audio_file.stat().st_size
-                    logger.info(
-                        f"音声ファイルを圧縮しました: {new_size / (1024*1024):.2f}MB"
-                    )
 
-                    if new_size > max_size:
-                        logger.info(
-                            "圧縮後もサイズが大きいため、音声分割してタイムスタンプ付き文字起こしを実行します"
-                        )
-                        # 分割処理（タイムスタンプ付き）
-                        segments = await self._split_audio_file(
-                            compressed_file, target_size_mb=20
-                        )
-                        if segments:
-                            result = await self._transcribe_segments_with_timestamps(
-                                segments, language
-                            )
-                            # 圧縮ファイルをクリーンアップ
-                            try:
-                                Path(compressed_file).unlink()
-                                logger.debug(
-                                    f"圧縮ファイルを削除しました: {compressed_file}"
-                                )
-                            except Exception as e:
-                                logger.warning(f"圧縮ファイル削除エラー: {e}")
-                            return result
-                        else:
-                            return {
-                                "text": f"音声ファイルが大きすぎます ({new_size / (1024*1024):.2f}MB > 25MB)。音声分割にも失敗しました。",
-                                "segments": [],
-                                "language": language,
-                                "duration": 0,
-                            }
-                else:
-                    # 圧縮に失敗した場合、元ファイルを直接分割
+                if new_size > max_size:
                     logger.info(
-                        "圧縮に失敗したため、元ファイルを分割してタイムスタンプ付き文字起こしを実行します"
+                        "圧縮後もサイズが大きいため、音声分割してタイムスタンプ付き文字起こしを実行します"
                     )
+                    # 分割処理（タイムスタンプ付き）
                     segments = await self._split_audio_file(
-                        audio_file_path, target_size_mb=20
+                        compressed_file, workdir, target_size_mb=20
                     )
                     if segments:
                         return await self._transcribe_segments_with_timestamps(
@@ -900,102 +1138,82 @@ class OpenAIProvider(LLMProvider):
                         )
                     else:
                         return {
-                            "text": f"音声ファイルが大きすぎます ({file_size / (1024*1024):.2f}MB > 25MB)。圧縮と分割の両方に失敗しました。",
+                            "text": f"音声ファイルが大きすぎます ({new_size / (1024*1024):.2f}MB > 25MB)。音声分割にも失敗しました。",
                             "segments": [],
                             "language": language,
                             "duration": 0,
                         }
 
-            logger.info(
-                f"タイムスタンプ付き文字起こしを実行中: {audio_file_path} ({file_size / (1024*1024):.2f}MB)"
-            )
-
-            # 最適化されたWhisperパラメータを取得（タイムスタンプ付き、コンテキスト情報を含む）
-            whisper_params = self._get_whisper_timestamp_parameters("discord", guild_id)
-            whisper_params["language"] = language
-
-            with open(audio_file, "rb") as file:
-                transcription = await self.client.audio.transcriptions.create(
-                    file=file, **whisper_params
+                audio_bytes = await asyncio.to_thread(audio_file.read_bytes)
+            else:
+                # 圧縮に失敗した場合、元ファイルを直接分割
+                logger.info(
+                    "圧縮に失敗したため、元ファイルを分割してタイムスタンプ付き文字起こしを実行します"
                 )
+                segments = await self._split_audio_file(
+                    audio_file_path, workdir, target_size_mb=20
+                )
+                if segments:
+                    return await self._transcribe_segments_with_timestamps(
+                        segments, language
+                    )
+                else:
+                    return {
+                        "text": f"音声ファイルが大きすぎます ({file_size / (1024*1024):.2f}MB > 25MB)。圧縮と分割の両方に失敗しました。",
+                        "segments": [],
+                        "language": language,
+                        "duration": 0,
+                    }
+
+        logger.info(
+            f"タイムスタンプ付き文字起こしを実行中: {audio_file_path} ({file_size / (1024*1024):.2f}MB)"
+        )
 
-            logger.info("タイムスタンプ付き文字起こし完了")
+        # 最適化されたWhisperパラメータを取得（タイムスタンプ付き、コンテキスト情報を含む）
+        whisper_params = self._get_whisper_timestamp_parameters("discord", guild_id)
+        whisper_params["language"] = language
 
-            # 一時ファイルのクリーンアップ
-            # 前処理ファイル
-            if (
-                "enhanced_file" in locals()
-                and enhanced_file
-                and enhanced_file != audio_file_path
-            ):
-                try:
-                    Path(enhanced_file).unlink()
-                    logger.debug(f"前処理ファイルを削除しました: {enhanced_file}")
-                except Exception:
-                    pass
-
-            # 圧縮ファイル
-            if compressed_file and compressed_file != audio_file_path:
-                try:
-                    Path(compressed_file).unlink()
-                    logger.debug(f"圧縮ファイルを削除しました: {compressed_file}")
-                except Exception:
-                    pass
+        # 読み込み済みのバイト列をそのままアップロード（ファイル名で形式を判定させる）
+        # 429・5xx・接続エラーはディスパッチャーが読み込み済みのバイト列のまま再試行する
+        client, dispatcher = self._next_client()
+        transcription = await dispatcher.submit(
+            lambda: client.audio.transcriptions.create(
+                file=(audio_file.name, audio_bytes), **whisper_params
+            )
+        )
 
-            return {
-                "text": transcription.text,
-                "segments": (
-                    transcription.segments if hasattr(transcription, "segments") else []
-                ),
-                "language": (
-                    transcription.language
-                    if hasattr(transcription, "language")
-                    else language
-                ),
-                "duration": (
-                    transcription.duration if hasattr(transcription, "duration") else 0
-                ),
-            }
+        logger.info("タイムスタンプ付き文字起こし完了")
 
-        except openai.OpenAIError as e:
-            logger.error(f"OpenAI API エラー: {e}")
-            return {
-                "text": f"音声の文字起こしでAPIエラーが発生しました: {str(e)}",
-                "segments": [],
-                "language": language,
-                "duration": 0,
-            }
-        except Exception as e:
-            logger.error(f"タイムスタンプ付き文字起こしエラー: {e}")
-            return {
-                "text": f"音声の文字起こし中に予期しないエラーが発生しました: {str(e)}",
-                "segments": [],
-                "language": language,
-                "duration": 0,
-            }
+        return {
+            "text": transcription.text,
+            "segments": (
+                transcription.segments if hasattr(transcription, "segments") else []
+            ),
+            "language": (
+                transcription.language
+                if hasattr(transcription, "language")
+                else language
+            ),
+            "duration": (
+                transcription.duration if hasattr(transcription, "duration") else 0
+            ),
+        }
 
     async def generate_text(
         self, prompt: str, max_tokens: int = 2000, temperature: float = 0.3
     ) -> str:
         """テキスト生成"""
         try:
-            import openai
-
-            response = await self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature,
+            result = await self._complete(
+                [{"role": "user", "content": prompt}], max_tokens, temperature
             )
-
-            result = response.choices[0].message.content.strip()
             if not result:
                 logger.warning("テキスト生成結果が空でした")
                 return "テキストの生成に失敗しました。"
 
             return result
 
-        except openai.OpenAIError as e:
+        except OpenAIError as e:
             logger.error(f"OpenAI API エラー: {e}")
             return f"テキスト生成でAPIエラーが発生しました: {str(e)}"
         except Exception as e:
@@ -1007,32 +1225,147 @@ class OpenAIProvider(LLMProvider):
         messages: List[Dict[str, str]],
         max_tokens: int = 2000,
         temperature: float = 0.3,
+        json_mode: bool = False,
     ) -> str:
         """チャット形式でのテキスト生成"""
         try:
-            import openai
-
-            response = await self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-
-            result = response.choices[0].message.content.strip()
+            result = await self._complete(messages, max_tokens, temperature, json_mode)
             if not result:
                 logger.warning("チャット生成結果が空でした")
                 return "チャットの生成に失敗しました。"
 
             return result
 
-        except openai.OpenAIError as e:
+        except OpenAIError as e:
             logger.error(f"OpenAI API エラー: {e}")
             return f"チャット生成でAPIエラーが発生しました: {str(e)}"
         except Exception as e:
             logger.error(f"チャット生成エラー: {e}")
             return f"チャット生成中に予期しないエラーが発生しました: {str(e)}"
 
+    async def generate_chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 2000,
+        temperature: float = 0.3,
+    ) -> AsyncIterator[str]:
+        """チャット形式でのテキスト生成を逐次返す
+
+        最後まで読まれた場合のみ結果をキャッシュする（途中で打ち切った呼び出し元は cache_stream_result で保存する）
+        """
+        key = None
+        if self.cache:
+            key = self._chat_cache_key(messages, max_tokens, temperature)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                logger.debug("LLMキャッシュにヒットしました")
+                yield cached
+                return
+
+        client, dispatcher = self._next_client()
+        stream = await dispatcher.submit(
+            lambda: client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            ),
+            estimated_tokens=estimate_tokens(messages, max_tokens),
+        )
+
+        parts = []
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            # 呼び出し元が途中で打ち切った場合も接続を閉じて生成を止める
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+        result = "".join(parts).strip()
+        if key and result:
+            await asyncio.to_thread(self.cache.set, key, result)
+
+    async def cache_stream_result(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        text: str,
+    ) -> None:
+        """呼び出し元が終端を検出して打ち切ったストリーミング生成の結果を保存"""
+        if self.cache and text:
+            key = self._chat_cache_key(messages, max_tokens, temperature)
+            await asyncio.to_thread(self.cache.set, key, text)
+
+    def _chat_cache_key(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> str:
+        """チャット生成のキャッシュキー（ストリーミングと一括生成で共通）"""
+        return make_cache_key(
+            model=self.chat_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            json_mode=json_mode,
+        )
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> str:
+        """チャットAPIを呼び出して本文を返す（キャッシュがあれば再利用）"""
+        key = None
+        if self.cache:
+            key = self._chat_cache_key(messages, max_tokens, temperature, json_mode)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                logger.debug("LLMキャッシュにヒットしました")
+                return cached
+
+        result = await self._request_completion(
+            messages, max_tokens, temperature, json_mode
+        )
+        if key and result:
+            await asyncio.to_thread(self.cache.set, key, result)
+        return result
+
+    async def _request_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+    ) -> str:
+        """チャットAPIを即時に呼び出して本文を返す"""
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        client, dispatcher = self._next_client()
+        response = await dispatcher.submit(
+            lambda: client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **extra,
+            ),
+            estimated_tokens=estimate_tokens(messages, max_tokens),
+        )
+        return (response.choices[0].message.content or "").strip()
+
     def validate_api_key(self) -> bool:
         """APIキーの有効性をチェック"""
         try:
@@ -1045,12 +1378,21 @@ class OpenAIProvider(LLMProvider):
         return "OpenAI"
 
 
+# Gemini へのプロンプト変換時のロールごとの接頭辞
+_GEMINI_ROLE_PREFIX = {
+    "system": "システム: ",
+    "user": "ユーザー: ",
+    "assistant": "アシスタント: ",
+}
+
+
 class GeminiProvider(LLMProvider):
     """Gemini APIプロバイダー"""
 
-    def __init__(self, api_key: Optional[str] = None):
-        import os
+    # 初期化に成功したモデル名（以降のインスタンス作成では候補の試行を省略する）
+    _cached_model_name: Optional[str] = None
 
+    def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         super().__init__(self.api_key)
 
@@ -1060,8 +1402,11 @@ class GeminiProvider(LLMProvider):
             genai.configure(api_key=self.api_key)
             self.genai = genai
 
-            # モデルの初期化（複数のモデルを試行）
+            # モデルの初期化（複数のモデルを試行、成功済みのモデルがあれば最初に試す）
             model_names = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro"]
+            cached = GeminiProvider._cached_model_name
+            if cached:
+                model_names = [cached] + [m for m in model_names if m != cached]
             self.text_model = None
             self.model_name = None
 
@@ -1069,6 +1414,7 @@ class GeminiProvider(LLMProvider):
                 try:
                     self.text_model = genai.GenerativeModel(model_name)
                     self.model_name = model_name
+                    GeminiProvider._cached_model_name = model_name
                     logger.info(f"Gemini モデルを初期化しました: {model_name}")
                     break
                 except Exception as e:
@@ -1118,15 +1464,9 @@ class GeminiProvider(LLMProvider):
                 "temperature": temperature,
             }
 
-            # 同期メソッドを非同期で実行
-            import asyncio
-
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.text_model.generate_content(
-                    prompt, generation_config=generation_config
-                ),
+            # ネイティブの非同期APIで実行（スレッドプールを経由しない）
+            response = await self.text_model.generate_content_async(
+                prompt, generation_config=generation_config
             )
 
             if response.text:
@@ -1144,23 +1484,16 @@ class GeminiProvider(LLMProvider):
         messages: List[Dict[str, str]],
         max_tokens: int = 2000,
         temperature: float = 0.3,
+        json_mode: bool = False,
     ) -> str:
-        """チャット形式でのテキスト生成"""
+        """チャット形式でのテキスト生成（JSON出力はプロンプトの指示に従わせる）"""
         try:
-            # メッセージを Gemini 形式に変換
-            prompt_parts = []
-            for message in messages:
-                role = message.get("role", "user")
-                content = message.get("content", "")
-
-                if role == "system":
-                    prompt_parts.append(f"システム: {content}")
-                elif role == "user":
-                    prompt_parts.append(f"ユーザー: {content}")
-                elif role == "assistant":
-                    prompt_parts.append(f"アシスタント: {content}")
-
-            full_prompt = "\n\n".join(prompt_parts)
+            # メッセージを Gemini 形式に変換（未知のロールは含めない）
+            full_prompt = "\n\n".join(
+                f"{_GEMINI_ROLE_PREFIX[role]}{message.get('content', '')}"
+                for message in messages
+                if (role := message.get("role", "user")) in _GEMINI_ROLE_PREFIX
+            )
 
             return await self.generate_text(full_prompt, max_tokens, temperature)
 
@@ -1182,13 +1515,15 @@ class GeminiProvider(LLMProvider):
 
 def create_llm_provider(provider_name: str = None) -> LLMProvider:
     """LLMプロバイダーのファクトリー関数"""
-    import os
-
     if provider_name is None:
         provider_name = os.getenv("LLM_PROVIDER", "openai").lower()
 
     if provider_name == "openai":
         return OpenAIProvider()
+    elif provider_name == "openai-batch":
+        from .batch_provider import BatchOpenAIProvider
+
+        return BatchOpenAIProvider()
     elif provider_name == "gemini":
         return GeminiProvider()
     else:
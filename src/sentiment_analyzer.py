@@ -1,13 +1,128 @@
+import asyncio
 import logging
 import re
 import os
+from operator import itemgetter
 from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from collections import defaultdict
+from .llm_cache import dump_cache_value, get_llm_cache, make_cache_key
 from .llm_providers import LLMProvider
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 logger = logging.getLogger(__name__)
 
+# 感情を表すキーワード辞書
+EMOTION_KEYWORDS = {
+    'positive': {
+        'joy': ['嬉しい', 'うれしい', '楽しい', '喜ぶ', '満足', '良かった', 'よかった', '素晴らしい', 'すばらしい'],
+        'enthusiasm': ['やる気', 'がんばる', '頑張る', '期待', '楽しみ', 'わくわく', 'ワクワク'],
+        'agreement': ['賛成', '同感', 'そうですね', 'いいですね', 'その通り', '正しい'],
+        'appreciation': ['ありがとう', '感謝', 'お疲れ様', 'おつかれさま', '助かる', 'すごい'],
+    },
+    'negative': {
+        'concern': ['心配', '不安', '気になる', '困る', '問題', '課題', 'リスク'],
+        'frustration': ['困った', 'イライラ', 'いらいら', '大変', 'きつい', '厳しい'],
+        'disagreement': ['反対', '違う', 'おかしい', '間違い', 'だめ', 'ダメ', '無理'],
+        'disappointment': ['残念', 'がっかり', '期待外れ', '失敗', 'うまくいかない'],
+    },
+    'neutral': {
+        'factual': ['です', 'ます', 'について', 'として', 'による', '確認', '報告'],
+        'inquiry': ['どう', 'なぜ', 'いつ', 'どこで', '質問', '疑問', '確認したい'],
+    }
+}
+
+# 感情の強度を表す修飾語と倍率
+INTENSITY_MODIFIERS = {
+    'very_high': ['本当に', '非常に', 'とても', 'すごく', 'めちゃくちゃ', '超'],
+    'high': ['かなり', 'だいぶ', 'すごい', '結構'],
+    'medium': ['ちょっと', 'やや', '少し', 'まあまあ'],
+    'low': ['それほど', 'あまり', 'そんなに']
+}
+INTENSITY_WEIGHTS = {'very_high': 2.0, 'high': 1.5, 'medium': 1.2, 'low': 0.8}
+
+# 感情の種類ごとの感情スコアへの加算値
+EMOTION_WEIGHTS = {'positive': 1.0, 'negative': 1.0, 'neutral': 0.5}
+
+
+def _build_keyword_tags() -> Dict[str, Tuple[Tuple[str, str, float], ...]]:
+    """キーワード → (種類, 感情名または強度, 加算値) のフラットな照合テーブルを構築"""
+    tags = defaultdict(list)
+    for sentiment_type, emotion_dict in EMOTION_KEYWORDS.items():
+        for emotion, keywords in emotion_dict.items():
+            for keyword in keywords:
+                tags[keyword].append((sentiment_type, emotion, EMOTION_WEIGHTS[sentiment_type]))
+    for intensity, modifiers in INTENSITY_MODIFIERS.items():
+        for modifier in modifiers:
+            tags[modifier].append(('intensity', intensity, INTENSITY_WEIGHTS[intensity]))
+    return {keyword: tuple(entries) for keyword, entries in tags.items()}
+
+
+def _build_keyword_scores(
+    tags: Dict[str, Tuple[Tuple[str, str, float], ...]]
+) -> Dict[str, Tuple[int, int, Optional[float], Tuple[Tuple[str, float], ...]]]:
+    """キーワードごとの加算値を事前集計（ポジティブ数, ネガティブ数, 強度, 感情加算値）"""
+    scores = {}
+    for keyword, entries in tags.items():
+        positive = sum(1 for sentiment_type, _, _ in entries if sentiment_type == 'positive')
+        negative = sum(1 for sentiment_type, _, _ in entries if sentiment_type == 'negative')
+        intensity = max(
+            (weight for sentiment_type, _, weight in entries if sentiment_type == 'intensity'),
+            default=None,
+        )
+        emotions = tuple(
+            (name, weight) for sentiment_type, name, weight in entries
+            if sentiment_type != 'intensity'
+        )
+        scores[keyword] = (positive, negative, intensity, emotions)
+    return scores
+
+
+# キーワードと強度修飾語を1つの照合器にまとめる（1回の走査で全キーワードを検出）
+_KEYWORD_TAGS = _build_keyword_tags()
+_KEYWORD_SCORES = _build_keyword_scores(_KEYWORD_TAGS)
+_KEYWORD_TABLE = tuple(_KEYWORD_TAGS)
+
+_AUTOMATON = None
+if ahocorasick is not None:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _keyword in _KEYWORD_TABLE:
+        _AUTOMATON.add_word(_keyword, _keyword)
+    _AUTOMATON.make_automaton()
+
+# 文の区切り（句点・感嘆符・疑問符・改行）で分けた1文
+SENTENCE_PATTERN = re.compile(r"[^。！？!?\n]+")
+
+# AI感情分析で1リクエストにまとめる文の数
+SENTIMENT_BATCH_SIZE = 20
+
+# プロンプトや出力形式を変更したら上げる（キャッシュ済みの古い分析結果を使わないため）
+SENTIMENT_PROMPT_VERSION = 1
+
+SENTIMENT_BATCH_PROMPT = """[目的] 番号付きテキストごとの感情分析
+[項目] sentiment: positive/negative/neutral、confidence: 0-1、emotions: 喜び・心配・怒り・同意・期待 各0-1
+[出力] JSONオブジェクトのみ（iはテキスト番号）:
+{"results": [{"i": 0, "sentiment": "positive", "confidence": 0.8, "emotions": {"喜び": 0.7, "心配": 0.0, "怒り": 0.0, "同意": 0.3, "期待": 0.2}}]}
+
+テキスト:
+"""
+
+# 感情の絵文字マッピング
+SENTIMENT_EMOJI = {
+    'positive': '😊',
+    'negative': '😟',
+    'neutral': '😐'
+}
+
 
 @dataclass
 class SentimentInfo:
@@ -40,33 +155,13 @@ class SentimentAnalyzer:
         # 感情分析の有効/無効設定
         self.enable_sentiment_analysis = os.getenv("ENABLE_SENTIMENT_ANALYSIS", "false").lower() == "true"
         
-        # 感情を表すキーワード辞書
-        self.emotion_keywords = {
-            'positive': {
-                'joy': ['嬉しい', 'うれしい', '楽しい', '喜ぶ', '満足', '良かった', 'よかった', '素晴らしい', 'すばらしい'],
-                'enthusiasm': ['やる気', 'がんばる', '頑張る', '期待', '楽しみ', 'わくわく', 'ワクワク'],
-                'agreement': ['賛成', '同感', 'そうですね', 'いいですね', 'その通り', '正しい'],
-                'appreciation': ['ありがとう', '感謝', 'お疲れ様', 'おつかれさま', '助かる', 'すごい'],
-            },
-            'negative': {
-                'concern': ['心配', '不安', '気になる', '困る', '問題', '課題', 'リスク'],
-                'frustration': ['困った', 'イライラ', 'いらいら', '大変', 'きつい', '厳しい'],
-                'disagreement': ['反対', '違う', 'おかしい', '間違い', 'だめ', 'ダメ', '無理'],
-                'disappointment': ['残念', 'がっかり', '期待外れ', '失敗', 'うまくいかない'],
-            },
-            'neutral': {
-                'factual': ['です', 'ます', 'について', 'として', 'による', '確認', '報告'],
-                'inquiry': ['どう', 'なぜ', 'いつ', 'どこで', '質問', '疑問', '確認したい'],
-            }
-        }
-        
-        # 感情の強度を表す修飾語
-        self.intensity_modifiers = {
-            'very_high': ['本当に', '非常に', 'とても', 'すごく', 'めちゃくちゃ', '超'],
-            'high': ['かなり', 'だいぶ', 'すごい', '結構'],
-            'medium': ['ちょっと', 'やや', '少し', 'まあまあ'],
-            'low': ['それほど', 'あまり', 'そんなに']
-        }
+        # キーワード辞書（照合用のテーブルはモジュール読み込み時に構築済み）
+        self.emotion_keywords = EMOTION_KEYWORDS
+        self.intensity_modifiers = INTENSITY_MODIFIERS
+        self.intensity_weights = INTENSITY_WEIGHTS
+
+        # 文ごとの感情分析結果の永続キャッシュ（LLM_CACHE_ENABLED=true の場合のみ）
+        self.cache = get_llm_cache()
 
     async def analyze_meeting_sentiment(
         self, 
@@ -102,88 +197,108 @@ class SentimentAnalyzer:
 
     async def _analyze_sentences(self, text: str) -> List[SentimentInfo]:
         """文ごとの感情分析"""
-        sentences = [s.strip() for s in text.split('。') if s.strip() and len(s.strip()) > 5]
-        sentiments = []
+        sentences = [
+            sentence for sentence in (m.group().strip() for m in SENTENCE_PATTERN.finditer(text))
+            if len(sentence) > 5
+        ]
         
-        for sentence in sentences:
-            if self.llm_provider:
-                # AI による高度な感情分析
-                sentiment_info = await self._ai_sentiment_analysis(sentence)
-            else:
-                # ルールベースの基本感情分析
-                sentiment_info = self._basic_sentiment_analysis(sentence)
-            
-            if sentiment_info:
-                sentiments.append(sentiment_info)
+        if self.llm_provider:
+            # AI による高度な感情分析（重複する文は1回だけ分析し、複数文を1リクエストにまとめて並行実行）
+            unique = list(dict.fromkeys(sentences))
+            batches = [
+                unique[i:i + SENTIMENT_BATCH_SIZE]
+                for i in range(0, len(unique), SENTIMENT_BATCH_SIZE)
+            ]
+            results = await asyncio.gather(
+                *(self._ai_sentiment_analysis_batch(batch) for batch in batches)
+            )
+            result_map = dict(zip(unique, (info for batch in results for info in batch)))
+            sentiments = [result_map[sentence] for sentence in sentences]
+        else:
+            # ルールベースの基本感情分析（重複する文は1回だけ分析）
+            result_map = {sentence: self._basic_sentiment_analysis(sentence)
+                          for sentence in dict.fromkeys(sentences)}
+            sentiments = [result_map[sentence] for sentence in sentences]
         
-        return sentiments
+        return [info for info in sentiments if info]
 
     async def _ai_sentiment_analysis(self, text: str) -> Optional[SentimentInfo]:
         """AI による感情分析"""
+        return (await self._ai_sentiment_analysis_batch([text]))[0]
+
+    async def _ai_sentiment_analysis_batch(self, texts: List[str]) -> List[Optional[SentimentInfo]]:
+        """AI による複数テキストの感情分析（分析済みの文はキャッシュから返す）"""
+        if not self.cache:
+            return await self._request_sentiments(texts)
+
+        provider_name = getattr(self.llm_provider, "provider_name", "")
+        model = (getattr(self.llm_provider, "chat_model", None)
+                 or getattr(self.llm_provider, "model_name", None))
+        keys = [
+            make_cache_key(sentiment=text, provider=provider_name, model=model,
+                           prompt_version=SENTIMENT_PROMPT_VERSION)
+            for text in texts
+        ]
+        cached = await asyncio.to_thread(lambda: [self.cache.get(key) for key in keys])
+        results = [
+            SentimentInfo(**json_loads(value)) if value is not None else None
+            for value in cached
+        ]
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        analyzed = await self._request_sentiments([texts[i] for i in pending])
+
+        entries = []
+        for i, info in zip(pending, analyzed):
+            results[i] = info
+            if info:
+                entries.append((keys[i], dump_cache_value(asdict(info))))
+        if entries:
+            await asyncio.to_thread(lambda: [self.cache.set(k, v) for k, v in entries])
+        return results
+
+    async def _request_sentiments(self, texts: List[str]) -> List[Optional[SentimentInfo]]:
+        """AI による複数テキストの感情分析（1リクエストでJSONを返させる）"""
         try:
-            prompt = f"""以下のテキストの感情を分析してください。
-
-テキスト: "{text}"
-
-以下の項目を評価してください：
-1. 全体的な感情: positive/negative/neutral
-2. 信頼度: 0-1の数値
-3. 具体的な感情:
-   - 喜び (0-1)
-   - 心配・不安 (0-1)
-   - 怒り・不満 (0-1)
-   - 同意・賛成 (0-1)
-   - 期待・意欲 (0-1)
-
-回答形式:
-感情: [positive/negative/neutral]
-信頼度: [0-1の数値]
-喜び: [0-1の数値]
-心配: [0-1の数値]
-怒り: [0-1の数値]
-同意: [0-1の数値]
-期待: [0-1の数値]"""
-
-            if hasattr(self.llm_provider, 'generate_text'):
-                response = await self.llm_provider.generate_text(prompt, max_tokens=300, temperature=0.2)
-                return self._parse_ai_sentiment(text, response)
+            numbered = "\n".join(f"{i}: {text}" for i, text in enumerate(texts))
+            messages = [{"role": "user", "content": SENTIMENT_BATCH_PROMPT + numbered}]
+            response = await self.llm_provider.generate_chat_completion(
+                messages, max_tokens=100 * len(texts) + 100, temperature=0.2, json_mode=True
+            )
+            return self._parse_ai_sentiments(texts, response)
         
         except Exception as e:
             logger.error(f"AI感情分析エラー: {e}")
         
-        return None
+        return [None] * len(texts)
 
-    def _parse_ai_sentiment(self, text: str, ai_response: str) -> Optional[SentimentInfo]:
-        """AI の感情分析結果を解析"""
+    def _parse_ai_sentiments(self, texts: List[str], ai_response: str) -> List[Optional[SentimentInfo]]:
+        """AI の感情分析結果（JSON）を解析"""
+        results: List[Optional[SentimentInfo]] = [None] * len(texts)
         try:
-            lines = ai_response.strip().split('\n')
-            sentiment = 'neutral'
-            confidence = 0.5
-            emotions = {}
-            
-            for line in lines:
-                line = line.strip()
-                if line.startswith('感情:'):
-                    sentiment = line.split(':')[1].strip()
-                elif line.startswith('信頼度:'):
-                    confidence = float(line.split(':')[1].strip())
-                elif ':' in line:
-                    key, value = line.split(':', 1)
-                    try:
-                        emotions[key.strip()] = float(value.strip())
-                    except ValueError:
-                        continue
+            start, end = ai_response.find("{"), ai_response.rfind("}")
+            data = json_loads(ai_response[start:end + 1])
             
-            return SentimentInfo(
-                text=text,
-                sentiment=sentiment,
-                confidence=confidence,
-                emotions=emotions
-            )
+            for item in data.get("results", []):
+                index = int(item.get("i", -1))
+                if not 0 <= index < len(texts):
+                    continue
+                sentiment = item.get("sentiment", "neutral")
+                if sentiment not in ("positive", "negative", "neutral"):
+                    sentiment = "neutral"
+                results[index] = SentimentInfo(
+                    text=texts[index],
+                    sentiment=sentiment,
+                    confidence=float(item.get("confidence", 0.5)),
+                    emotions={k: float(v) for k, v in (item.get("emotions") or {}).items()}
+                )
         
         except Exception as e:
             logger.error(f"AI感情分析結果解析エラー: {e}")
-            return None
+        
+        return results
 
     def _basic_sentiment_analysis(self, text: str) -> SentimentInfo:
         """ルールベースの基本感情分析"""
@@ -191,34 +306,20 @@ class SentimentAnalyzer:
         negative_score = 0
         emotions = defaultdict(float)
         
-        # 感情キーワードをチェック
-        for sentiment_type, emotion_dict in self.emotion_keywords.items():
-            for emotion, keywords in emotion_dict.items():
-                for keyword in keywords:
-                    if keyword in text:
-                        if sentiment_type == 'positive':
-                            positive_score += 1
-                            emotions[emotion] += 1
-                        elif sentiment_type == 'negative':
-                            negative_score += 1
-                            emotions[emotion] += 1
-                        else:  # neutral
-                            emotions[emotion] += 0.5
+        # 感情キーワード・強度修飾語をまとめて検出し、事前集計した加算値を足し込む
+        intensity_multiplier = None
+        for keyword in self._find_keywords(text):
+            positive, negative, intensity, keyword_emotions = _KEYWORD_SCORES[keyword]
+            positive_score += positive
+            negative_score += negative
+            for name, weight in keyword_emotions:
+                emotions[name] += weight
+            # 強度修飾語を考慮（複数あれば最も強いものを採用）
+            if intensity is not None and (intensity_multiplier is None or intensity > intensity_multiplier):
+                intensity_multiplier = intensity
         
-        # 強度修飾語を考慮
-        intensity_multiplier = 1.0
-        for intensity, modifiers in self.intensity_modifiers.items():
-            for modifier in modifiers:
-                if modifier in text:
-                    if intensity == 'very_high':
-                        intensity_multiplier = 2.0
-                    elif intensity == 'high':
-                        intensity_multiplier = 1.5
-                    elif intensity == 'medium':
-                        intensity_multiplier = 1.2
-                    elif intensity == 'low':
-                        intensity_multiplier = 0.8
-                    break
+        if intensity_multiplier is None:
+            intensity_multiplier = 1.0
         
         positive_score *= intensity_multiplier
         negative_score *= intensity_multiplier
@@ -241,21 +342,39 @@ class SentimentAnalyzer:
             emotions=dict(emotions)
         )
 
+    def _find_keywords(self, text: str) -> set:
+        """テキストに含まれるキーワードを検出（pyahocorasick があれば1パスで照合）"""
+        if _AUTOMATON is not None:
+            return {keyword for _, keyword in _AUTOMATON.iter(text)}
+        return {keyword for keyword in _KEYWORD_TABLE if keyword in text}
+
     async def _analyze_speaker_sentiments(self, speaker_segments: List) -> Dict[str, Dict[str, float]]:
         """話者別感情分析"""
         speaker_sentiments = defaultdict(lambda: {'positive': 0, 'negative': 0, 'neutral': 0})
         
+        # 話者ごとに発言をまとめ、AI感情分析はバッチ単位で並行実行
+        texts_by_speaker = defaultdict(list)
         for segment in speaker_segments:
             if hasattr(segment, 'text') and hasattr(segment, 'user_name'):
-                sentiment_info = await self._ai_sentiment_analysis(segment.text)
+                texts_by_speaker[segment.user_name].append(segment.text)
+        
+        batches = [
+            (speaker_name, texts[i:i + SENTIMENT_BATCH_SIZE])
+            for speaker_name, texts in texts_by_speaker.items()
+            for i in range(0, len(texts), SENTIMENT_BATCH_SIZE)
+        ]
+        if self.llm_provider:
+            results = await asyncio.gather(
+                *(self._ai_sentiment_analysis_batch(texts) for _, texts in batches)
+            )
+        else:
+            results = [[None] * len(texts) for _, texts in batches]
+        
+        for (speaker_name, texts), infos in zip(batches, results):
+            for text, sentiment_info in zip(texts, infos):
                 if not sentiment_info:
-                    sentiment_info = self._basic_sentiment_analysis(segment.text)
-                
-                speaker_name = segment.user_name
-                sentiment = sentiment_info.sentiment
-                confidence = sentiment_info.confidence
-                
-                speaker_sentiments[speaker_name][sentiment] += confidence
+                    sentiment_info = self._basic_sentiment_analysis(text)
+                speaker_sentiments[speaker_name][sentiment_info.sentiment] += sentiment_info.confidence
         
         # 正規化
         for speaker, sentiments in speaker_sentiments.items():
@@ -283,9 +402,20 @@ class SentimentAnalyzer:
                 speaker_sentiments=speaker_sentiments
             )
         
-        # 全体的な感情比率を計算
-        positive_count = sum(1 for s in sentence_sentiments if s.sentiment == 'positive')
-        negative_count = sum(1 for s in sentence_sentiments if s.sentiment == 'negative')
+        # 感情ごとの件数と、信頼度の高いポジティブ・ネガティブな発言（各3件まで）を1パスで集計
+        positive_count = 0
+        negative_count = 0
+        positive_moments = []
+        negative_moments = []
+        for s in sentence_sentiments:
+            if s.sentiment == 'positive':
+                positive_count += 1
+                if s.confidence > 0.7 and len(positive_moments) < 3:
+                    positive_moments.append(s.text)
+            elif s.sentiment == 'negative':
+                negative_count += 1
+                if s.confidence > 0.7 and len(negative_moments) < 3:
+                    negative_moments.append(s.text)
         neutral_count = len(sentence_sentiments) - positive_count - negative_count
         
         total = len(sentence_sentiments)
@@ -301,17 +431,6 @@ class SentimentAnalyzer:
         else:
             overall_sentiment = 'neutral'
         
-        # 重要なポジティブ・ネガティブモーメントを抽出
-        positive_moments = [
-            s.text for s in sentence_sentiments 
-            if s.sentiment == 'positive' and s.confidence > 0.7
-        ][:3]
-        
-        negative_moments = [
-            s.text for s in sentence_sentiments 
-            if s.sentiment == 'negative' and s.confidence > 0.7
-        ][:3]
-        
         return MeetingSentiment(
             overall_sentiment=overall_sentiment,
             positive_ratio=positive_ratio,
@@ -327,17 +446,11 @@ class SentimentAnalyzer:
         if not meeting_sentiment:
             return "感情分析結果がありません。"
         
-        # 感情の絵文字マッピング
-        sentiment_emoji = {
-            'positive': '😊',
-            'negative': '😟',
-            'neutral': '😐'
-        }
-        
+        emoji_get = SENTIMENT_EMOJI.get
         lines = ["=== 会議感情分析 ===\n"]
         
         # 全体感情
-        emoji = sentiment_emoji.get(meeting_sentiment.overall_sentiment, '😐')
+        emoji = emoji_get(meeting_sentiment.overall_sentiment, '😐')
         lines.append(f"🎭 **全体的な雰囲気**: {emoji} {meeting_sentiment.overall_sentiment}")
         lines.append("")
         
@@ -366,9 +479,8 @@ class SentimentAnalyzer:
         if meeting_sentiment.speaker_sentiments:
             lines.append("👥 **参加者別感情傾向**")
             for speaker, sentiments in meeting_sentiment.speaker_sentiments.items():
-                dominant = max(sentiments.keys(), key=lambda k: sentiments[k])
-                dominant_emoji = sentiment_emoji.get(dominant, '😐')
-                lines.append(f"  {dominant_emoji} {speaker}: {dominant} ({sentiments[dominant]:.1%})")
+                dominant, ratio = max(sentiments.items(), key=itemgetter(1))
+                lines.append(f"  {emoji_get(dominant, '😐')} {speaker}: {dominant} ({ratio:.1%})")
             lines.append("")
         
         return "\n".join(lines)
\ No newline at end of file
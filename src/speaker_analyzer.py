@@ -1,18 +1,34 @@
 import logging
 import asyncio
+import heapq
+import math
 import os
-from datetime import datetime
+from bisect import bisect_right
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import discord
 from pydub import AudioSegment
-import io
-import tempfile
 from dataclasses import dataclass
 import re
 
+try:
+    import audioop
+except ImportError:
+    import pyaudioop as audioop
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
 logger = logging.getLogger(__name__)
 
+# 音量による発言判定の閾値（dBFS）。トラック全体のピークがこれ未満なら発言なしとみなす
+SILENCE_THRESHOLD = -40
+
+# 文字起こし結果を文単位に分割する区切り（。 ． ！ ？ ! ? と改行）
+SENTENCE_BOUNDARY = re.compile(r"[。．！？!?]+|\n+")
+
 
 @dataclass
 class SpeakerSegment:
@@ -53,14 +69,24 @@ class SpeakerAnalyzer:
         
         # 話者切り替え検出の閾値（秒）
         self.speaker_change_threshold = float(os.getenv("SPEAKER_CHANGE_THRESHOLD", "0.5"))
+        
+        # WebRTC VADの判定モード（webrtcvad がインストールされている場合のみ。0-3で大きいほど厳しく判定）
+        self.vad_mode = None
+        if webrtcvad is not None:
+            self.vad_mode = int(os.getenv("WEBRTC_VAD_MODE", "2"))
 
     async def analyze_recording_with_speakers(
         self, 
         sink: discord.sinks.Sink, 
         participants: List[discord.Member],
-        transcription: str
+        transcription: str,
+        transcript_segments: Optional[List[Any]] = None
     ) -> Tuple[List[SpeakerSegment], List[SpeechStatistics]]:
-        """録音データから話者識別・統計分析を実行"""
+        """録音データから話者識別・統計分析を実行
+
+        transcript_segments にWhisperのタイムスタンプ付きセグメントを渡すと、
+        発言区間との重なりで話者を割り当てる（未指定時は文を均等に配分）
+        """
         try:
             if not self.enable_speaker_identification:
                 # 話者識別無効時は全体を1つのセグメントとして扱う
@@ -68,23 +94,25 @@ class SpeakerAnalyzer:
             
             logger.info("話者識別分析を開始")
             
-            # 1. 各参加者の個別音声ファイルを作成
-            speaker_audio_files = await self._extract_individual_audio(sink, participants)
+            # 1. 各参加者の個別音声を読み込み
+            speaker_audio = await self._extract_individual_audio(sink, participants)
             
             # 2. 各音声の活動区間を検出
-            speaker_activities = await self._detect_speech_activities(speaker_audio_files)
+            speaker_activities = await self._detect_speech_activities(speaker_audio)
             
             # 3. 文字起こし結果を話者ごとに分割
-            speaker_segments = await self._assign_text_to_speakers(
-                transcription, speaker_activities, participants
-            )
+            if transcript_segments and any(speaker_activities.values()):
+                speaker_segments = self._assign_timed_segments_to_speakers(
+                    transcript_segments, speaker_activities, participants
+                )
+            else:
+                speaker_segments = await self._assign_text_to_speakers(
+                    transcription, speaker_activities, participants
+                )
             
             # 4. 統計情報を計算
             statistics = self._calculate_statistics(speaker_segments, participants)
             
-            # 5. 一時ファイルをクリーンアップ
-            await self._cleanup_temp_files(speaker_audio_files)
-            
             logger.info(f"話者識別完了: {len(speaker_segments)} セグメント, {len(statistics)} 話者")
             return speaker_segments, statistics
             
@@ -97,100 +125,127 @@ class SpeakerAnalyzer:
         self, 
         sink: discord.sinks.Sink, 
         participants: List[discord.Member]
-    ) -> Dict[int, str]:
-        """各参加者の個別音声ファイルを抽出"""
-        speaker_files = {}
+    ) -> Dict[int, AudioSegment]:
+        """各参加者の個別音声を抽出（一時ファイルに書き出さずメモリ上で扱う）"""
+        speaker_audio = {}
         
         if not sink.audio_data:
             logger.warning("録音データが空です")
-            return speaker_files
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        for user_id, audio_data in sink.audio_data.items():
-            try:
-                # Discordのユーザー情報を取得
-                user = next((p for p in participants if p.id == user_id), None)
-                if not user:
-                    continue
-                
-                # ファイル名に使用する安全な表示名を作成
-                safe_name = re.sub(r"[^0-9A-Za-z._-]", "_", str(user.display_name))
-
-                # 音声データをファイルに保存
-                temp_file = tempfile.NamedTemporaryFile(
-                    suffix=f"_{safe_name}_{timestamp}.wav",
-                    delete=False
-                )
-
-                # AudioSegmentを使用して音声データを処理（バッファを安全に取得）
-                raw_audio: bytes = audio_data.file.getvalue()
-                audio = AudioSegment.from_file(io.BytesIO(raw_audio), format="wav")
-                
-                # 無音部分が多い場合はスキップ
-                if len(audio) < self.min_speech_duration * 1000:  # ms変換
-                    temp_file.close()
-                    os.unlink(temp_file.name)
-                    continue
-                
-                audio.export(temp_file.name, format="wav")
-                temp_file.close()
-                speaker_files[user_id] = temp_file.name
-                
-                logger.debug(f"個別音声ファイル作成: {user.display_name} -> {temp_file.name}")
-                
-            except Exception as e:
-                logger.error(f"個別音声抽出エラー (user_id: {user_id}): {e}")
+            return speaker_audio
+        
+        # Discordのユーザー情報を取得（録音されたが参加者一覧にいないユーザーは除外）
+        users = {p.id: p for p in participants}
+        targets = [
+            (user_id, users[user_id], audio_data)
+            for user_id, audio_data in sink.audio_data.items()
+            if user_id in users
+        ]
+        
+        # WAVのデコードは話者ごとに別スレッドで並行実行（イベントループを塞がない）
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._decode_audio, audio_data) for _, _, audio_data in targets),
+            return_exceptions=True
+        )
+        
+        for (user_id, user, _), result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"個別音声抽出エラー (user_id: {user_id}): {result}")
                 continue
+            audio, peak_dbfs = result
+            
+            # 無音部分が多い場合はスキップ
+            if len(audio) < self.min_speech_duration * 1000:  # ms変換
+                continue
+            
+            # 参加しただけで発言していない話者はVADを実行せずに除外
+            if peak_dbfs < SILENCE_THRESHOLD:
+                logger.debug(f"無音のため話者分析から除外: {user.display_name} (最大 {peak_dbfs:.1f} dBFS)")
+                continue
+            
+            speaker_audio[user_id] = audio
+            logger.debug(f"個別音声を読み込み: {user.display_name} ({len(audio) / 1000:.1f}秒)")
         
-        return speaker_files
+        return speaker_audio
+
+    @staticmethod
+    def _decode_audio(audio_data) -> Tuple[AudioSegment, float]:
+        """録音バッファのWAVをデコードし、ピーク音量（dBFS）とあわせて返す
+
+        WAVはpydub内で直接解析され、FFmpegは起動しない
+        """
+        # 録音データ（BytesIO・一時ファイル）を先頭から読み込む
+        audio_data.file.seek(0)
+        audio = AudioSegment.from_file(audio_data.file, format="wav")
+        return audio, audio.max_dBFS
 
     async def _detect_speech_activities(
         self, 
-        speaker_audio_files: Dict[int, str]
+        speaker_audio: Dict[int, AudioSegment]
     ) -> Dict[int, List[Tuple[float, float]]]:
-        """各話者の発言区間を検出"""
-        activities = {}
+        """各話者の発言区間を検出（話者ごとに別スレッドで並行実行し、イベントループを塞がない）"""
+        user_ids = list(speaker_audio)
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._detect_voice_activity, speaker_audio[user_id])
+              for user_id in user_ids),
+            return_exceptions=True
+        )
         
-        for user_id, audio_file in speaker_audio_files.items():
-            try:
-                # AudioSegmentで音声を読み込み
-                audio = AudioSegment.from_wav(audio_file)
-                
-                # 音声活動区間を検出（簡易版）
-                activity_segments = self._detect_voice_activity(audio)
-                activities[user_id] = activity_segments
-                
-            except Exception as e:
-                logger.error(f"音声活動検出エラー (user_id: {user_id}): {e}")
+        activities = {}
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"音声活動検出エラー (user_id: {user_id}): {result}")
                 activities[user_id] = []
+            else:
+                activities[user_id] = result
         
         return activities
 
     def _detect_voice_activity(self, audio: AudioSegment) -> List[Tuple[float, float]]:
         """音声活動区間検出（VAD: Voice Activity Detection）"""
-        # 簡易的なVAD実装
-        # 実際の実装では、より高度なVADアルゴリズム（WebRTCVAD等）を使用することを推奨
+        if self.vad_mode is not None:
+            return self._detect_voice_activity_webrtc(audio)
+        
+        # 簡易的なVAD実装（webrtcvad が無い場合の音量閾値による判定）
+        
+        # 100msごとにチェック
+        chunk_length = 100
+        flags = [db_level > SILENCE_THRESHOLD for db_level in self._chunk_levels(audio, chunk_length)]
+        return self._collect_speech_segments(flags, chunk_length, len(audio))
+
+    def _detect_voice_activity_webrtc(self, audio: AudioSegment) -> List[Tuple[float, float]]:
+        """WebRTC VAD による音声活動区間検出（呼吸音・キー入力音などを発言と誤判定しにくい）
+
+        Vad は直前のフレームから雑音レベルを学習する状態を持つため、話者ごとのスレッドで
+        共有せずトラックごとに作成する
+        """
+        sample_rate = 16000
+        frame_length = 30  # ms（WebRTC VADが受け付けるのは10/20/30ms）
         
-        silence_threshold = -40  # dBFS
-        min_silence_duration = 500  # ms
+        # 16kHz・モノラル・16bitに1回だけ変換
+        audio = audio.set_frame_rate(sample_rate).set_channels(1).set_sample_width(2)
+        data = memoryview(audio.raw_data)
+        frame_bytes = sample_rate * frame_length // 1000 * 2
+        
+        vad = webrtcvad.Vad(self.vad_mode)
+        flags = [
+            vad.is_speech(data[i:i + frame_bytes], sample_rate)
+            for i in range(0, len(data) - frame_bytes + 1, frame_bytes)
+        ]
+        return self._collect_speech_segments(flags, frame_length, len(audio))
+
+    def _collect_speech_segments(
+        self, flags: List[bool], chunk_length: int, total_length: int
+    ) -> List[Tuple[float, float]]:
+        """チャンクごとの発言判定を連続区間にまとめる（最小発言時間未満は除く）"""
         min_speech_duration = int(self.min_speech_duration * 1000)  # ms
         
         segments = []
         speech_start = None
         
-        # 100msごとにチェック
-        chunk_length = 100
-        for i in range(0, len(audio), chunk_length):
-            chunk = audio[i:i + chunk_length]
+        for index, is_speech in enumerate(flags):
+            i = index * chunk_length
             
-            if len(chunk) < chunk_length:
-                break
-            
-            # 音量レベルをチェック
-            db_level = chunk.dBFS
-            
-            if db_level > silence_threshold:
+            if is_speech:
                 # 音声検出
                 if speech_start is None:
                     speech_start = i / 1000.0  # 秒に変換
@@ -208,13 +263,28 @@ class SpeakerAnalyzer:
         
         # 最後のセグメントを処理
         if speech_start is not None:
-            speech_end = len(audio) / 1000.0
+            speech_end = total_length / 1000.0
             duration = (speech_end - speech_start) * 1000
             if duration >= min_speech_duration:
                 segments.append((speech_start, speech_end))
         
         return segments
 
+    @staticmethod
+    def _chunk_levels(audio: AudioSegment, chunk_length: int) -> List[float]:
+        """一定長（ms）ごとの音量（dBFS）を生データから直接計算（チャンクごとにAudioSegmentを作らない）"""
+        data = memoryview(audio.raw_data)
+        frame_width = audio.frame_width
+        max_amplitude = audio.max_possible_amplitude
+        
+        levels = []
+        for index in range(len(audio) // chunk_length):
+            start = int(audio.frame_count(ms=index * chunk_length)) * frame_width
+            end = int(audio.frame_count(ms=(index + 1) * chunk_length)) * frame_width
+            rms = audioop.rms(data[start:end], audio.sample_width)
+            levels.append(20 * math.log10(rms / max_amplitude) if rms else -math.inf)
+        return levels
+
     async def _assign_text_to_speakers(
         self,
         transcription: str,
@@ -228,20 +298,19 @@ class SpeakerAnalyzer:
             # 話者活動が検出されない場合は、全体を最初の参加者として扱う
             return self._create_single_segment(transcription, participants)
         
-        # 全ての発言区間を時系列順にソート
-        all_activities = []
-        for user_id, activities in speaker_activities.items():
-            user = next((p for p in participants if p.id == user_id), None)
-            if user:
-                for start, end in activities:
-                    all_activities.append((start, end, user_id, user.display_name))
-        
-        all_activities.sort(key=lambda x: x[0])  # 開始時間でソート
+        # 全ての発言区間を時系列順に並べる（話者ごとの区間は時系列順のためマージするだけでよい）
+        users = {p.id: p for p in participants}
+        all_activities = list(heapq.merge(
+            *(
+                [(start, end, user_id, users[user_id].display_name) for start, end in activities]
+                for user_id, activities in speaker_activities.items()
+                if user_id in users
+            ),
+            key=lambda x: x[0]  # 開始時間順
+        ))
         
         # 文字起こし結果を文単位に分割（簡易・日本語優先だが句読点の揺れに多少対応）
-        # 区切り: 。 ． ！ ？ ! ? と改行
-        raw_sentences = re.split(r"[。．！？!?]+|\n+", transcription)
-        sentences = [s.strip() for s in raw_sentences if s and s.strip()]
+        sentences = [s for s in map(str.strip, SENTENCE_BOUNDARY.split(transcription)) if s]
         if not sentences:
             return segments
         
@@ -273,6 +342,71 @@ class SpeakerAnalyzer:
         
         return segments
 
+    def _assign_timed_segments_to_speakers(
+        self,
+        transcript_segments: List[Any],
+        speaker_activities: Dict[int, List[Tuple[float, float]]],
+        participants: List[discord.Member]
+    ) -> List[SpeakerSegment]:
+        """タイムスタンプ付きの文字起こしセグメントを、発言区間の重なりが最大の話者に割り当てる"""
+        names = {p.id: p.display_name for p in participants}
+        # 話者ごとの発言区間は時系列順で重ならないため、終了時刻の二分探索で候補を絞れる
+        tracks = {
+            user_id: (activities, [end for _, end in activities])
+            for user_id, activities in speaker_activities.items()
+            if user_id in names and activities
+        }
+        
+        segments = []
+        for transcript_segment in transcript_segments:
+            start = float(self._segment_field(transcript_segment, "start"))
+            end = float(self._segment_field(transcript_segment, "end"))
+            text = str(self._segment_field(transcript_segment, "text") or "").strip()
+            if not text:
+                continue
+            
+            best_user, best_overlap = None, 0.0
+            for user_id, (activities, ends) in tracks.items():
+                overlap = 0.0
+                for index in range(bisect_right(ends, start), len(activities)):
+                    activity_start, activity_end = activities[index]
+                    if activity_start >= end:
+                        break
+                    overlap += min(end, activity_end) - max(start, activity_start)
+                if overlap > best_overlap:
+                    best_user, best_overlap = user_id, overlap
+            
+            if best_user is None:
+                # 重なる発言区間がない場合は直前の話者の続きとして扱う
+                if not segments:
+                    best_user = min(tracks, key=lambda user_id: tracks[user_id][0][0][0])
+                else:
+                    best_user = segments[-1].user_id
+            
+            previous = segments[-1] if segments else None
+            if (previous and previous.user_id == best_user
+                    and start - previous.end_time <= self.speaker_change_threshold):
+                # 同じ話者の連続した発言は1つのセグメントにまとめる
+                previous.text += text
+                previous.end_time = max(previous.end_time, end)
+            else:
+                segments.append(SpeakerSegment(
+                    user_id=best_user,
+                    user_name=names[best_user],
+                    start_time=start,
+                    end_time=end,
+                    text=text
+                ))
+        
+        return segments
+
+    @staticmethod
+    def _segment_field(segment: Any, name: str) -> Any:
+        """Whisperのセグメント（SDKのオブジェクトまたは辞書）から値を取得"""
+        if isinstance(segment, dict):
+            return segment.get(name)
+        return getattr(segment, name, None)
+
     def _create_single_segment(
         self, 
         transcription: str, 
@@ -302,21 +436,25 @@ class SpeakerAnalyzer:
         if not self.enable_speaker_statistics:
             return []
         
+        # 話者ごとの集計と全体の発言時間を1回の走査でまとめて計算
         stats_dict = {}
-        total_duration = sum(seg.end_time - seg.start_time for seg in segments if seg.end_time > 0)
+        total_duration = 0.0
         
         for segment in segments:
-            user_id = segment.user_id
-            if user_id not in stats_dict:
-                stats_dict[user_id] = {
+            duration = segment.end_time - segment.start_time
+            if segment.end_time > 0:
+                total_duration += duration
+            
+            stats = stats_dict.get(segment.user_id)
+            if stats is None:
+                stats = stats_dict[segment.user_id] = {
                     'user_name': segment.user_name,
                     'total_duration': 0.0,
                     'segment_count': 0,
                     'word_count': 0
                 }
             
-            stats = stats_dict[user_id]
-            stats['total_duration'] += segment.end_time - segment.start_time
+            stats['total_duration'] += duration
             stats['segment_count'] += 1
             stats['word_count'] += len(segment.text.replace('。', ' ').split())
         
@@ -338,16 +476,6 @@ class SpeakerAnalyzer:
         
         return sorted(statistics, key=lambda x: x.total_duration, reverse=True)
 
-    async def _cleanup_temp_files(self, speaker_audio_files: Dict[int, str]):
-        """一時ファイルのクリーンアップ"""
-        for user_id, file_path in speaker_audio_files.items():
-            try:
-                if os.path.exists(file_path):
-                    os.unlink(file_path)
-                    logger.debug(f"一時ファイル削除: {file_path}")
-            except Exception as e:
-                logger.warning(f"一時ファイル削除エラー: {e}")
-
     def format_speaker_segments(self, segments: List[SpeakerSegment]) -> str:
         """話者識別結果を整形されたテキストとして出力"""
         if not segments:
@@ -1,11 +1,28 @@
 import re
 import logging
 import asyncio
-from typing import Optional, Dict, List
+import functools
+from typing import Optional, Dict, List, Tuple
 from .llm_providers import LLMProvider
 
 logger = logging.getLogger(__name__)
 
+# クリーンアップ・句読点整理用のパターン（呼び出しごとに再コンパイルしない）
+WHITESPACE_PATTERN = re.compile(r'\s+')
+REPEATED_PUNCTUATION = re.compile(r'([。、])\1+')
+PUNCTUATION_SPACING = re.compile(r'\s*([。、！？])\s*')
+EXCLAMATION_SPACING = re.compile(r'([！？])([あ-んア-ンa-zA-Z])')
+
+
+def _build_replacer(patterns: Dict[str, List[str]]) -> Tuple["re.Pattern[str]", Dict[str, str]]:
+    """誤りパターン → 正しい表記 を1つの正規表現にまとめる（長いパターンを優先して1回の走査で置換）"""
+    replacements = {}
+    for correct, error_patterns in patterns.items():
+        for error_pattern in error_patterns:
+            replacements.setdefault(error_pattern, correct)
+    alternation = '|'.join(map(re.escape, sorted(replacements, key=len, reverse=True)))
+    return re.compile(alternation), replacements
+
 
 class TextPostProcessor:
     """文字起こし結果の後処理クラス"""
@@ -43,6 +60,13 @@ class TextPostProcessor:
             'データベース': ['データ ベース', 'データ　ベース'],
             'アルゴリズム': ['アルゴ リズム', 'アルゴ　リズム'],
         }
+        
+        # 一般的なエラーとカタカナ語をまとめて1回の走査で修正する
+        corrections = {**self.common_errors, **self.katakana_patterns}
+        self._correction_pattern, self._correction_map = _build_replacer(corrections)
+        
+        # AI修正前の決定的な処理は同じ入力に対して結果を再利用する（インスタンスごとのLRU）
+        self._clean_text = functools.lru_cache(maxsize=32)(self._run_rule_based_pipeline)
 
     async def process_transcription(
         self, 
@@ -54,20 +78,8 @@ class TextPostProcessor:
         try:
             logger.info("文字起こし後処理を開始")
             
-            # 1. 基本的なクリーンアップ
-            processed_text = self._basic_cleanup(text)
-            
-            # 2. 一般的なエラーパターンの修正
-            processed_text = self._fix_common_errors(processed_text)
-            
-            # 3. カタカナ語の正規化
-            processed_text = self._fix_katakana_words(processed_text)
-            
-            # 4. 句読点の整理
-            processed_text = self._normalize_punctuation(processed_text)
-            
-            # 5. 文章構造の改善
-            processed_text = self._improve_sentence_structure(processed_text)
+            # 1-5. ルールベースの整形（同じ入力はキャッシュから返す）
+            processed_text = self._clean_text(text)
             
             # 6. AIによる高度な修正（オプション）
             if use_ai_correction and self.llm_provider:
@@ -80,17 +92,30 @@ class TextPostProcessor:
             logger.error(f"後処理エラー: {e}")
             return text  # エラー時は元のテキストを返す
 
+    def _run_rule_based_pipeline(self, text: str) -> str:
+        """ルールベースの整形処理（AIを使わないため同じ入力には常に同じ結果を返す）"""
+        # 1. 基本的なクリーンアップ
+        processed_text = self._basic_cleanup(text)
+        
+        # 2-3. 一般的なエラーパターンの修正・カタカナ語の正規化
+        processed_text = self._apply_corrections(processed_text)
+        
+        # 4. 句読点の整理
+        processed_text = self._normalize_punctuation(processed_text)
+        
+        # 5. 文章構造の改善
+        return self._improve_sentence_structure(processed_text)
+
     def _basic_cleanup(self, text: str) -> str:
         """基本的なクリーンアップ処理"""
         # 余分な空白を除去
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_PATTERN.sub(' ', text)
         
         # 先頭と末尾の空白を除去
         text = text.strip()
         
         # 連続する句読点を整理
-        text = re.sub(r'[。]{2,}', '。', text)
-        text = re.sub(r'[、]{2,}', '、', text)
+        text = REPEATED_PUNCTUATION.sub(r'\1', text)
         
         # 不完全な文の除去（3文字未満の単独文）
         sentences = text.split('。')
@@ -102,30 +127,18 @@ class TextPostProcessor:
         
         return '。'.join(cleaned_sentences)
 
-    def _fix_common_errors(self, text: str) -> str:
-        """よくあるエラーパターンの修正"""
-        for correct, error_patterns in self.common_errors.items():
-            for error_pattern in error_patterns:
-                text = text.replace(error_pattern, correct)
-        return text
-
-    def _fix_katakana_words(self, text: str) -> str:
-        """カタカナ語の正規化"""
-        for correct, error_patterns in self.katakana_patterns.items():
-            for error_pattern in error_patterns:
-                text = text.replace(error_pattern, correct)
-        return text
+    def _apply_corrections(self, text: str) -> str:
+        """一般的なエラー・カタカナ語の修正を1回の走査で適用（重なる場合は長い一致を優先）"""
+        replacements = self._correction_map
+        return self._correction_pattern.sub(lambda m: replacements[m.group()], text)
 
     def _normalize_punctuation(self, text: str) -> str:
         """句読点の正規化"""
         # 句読点の前後の空白を調整
-        text = re.sub(r'\s*([。、！？])\s*', r'\1', text)
-        
-        # 文の始まりの小文字を大文字に（英語部分）
-        text = re.sub(r'([。！？]\s*)([a-z])', r'\1\2'.upper(), text)
+        text = PUNCTUATION_SPACING.sub(r'\1', text)
         
         # 感嘆符・疑問符の後に適切な空白を追加
-        text = re.sub(r'([！？])([あ-んア-ンa-zA-Z])', r'\1 \2', text)
+        text = EXCLAMATION_SPACING.sub(r'\1 \2', text)
         
         return text
 
@@ -202,7 +215,7 @@ class TextPostProcessor:
         return {
             "original_length": len(original),
             "processed_length": len(processed),
-            "original_sentences": len(original.split('。')) - 1,
-            "processed_sentences": len(processed.split('。')) - 1,
+            "original_sentences": original.count('。'),
+            "processed_sentences": processed.count('。'),
             "improvement_ratio": len(processed) / len(original) if len(original) > 0 else 1.0,
         }
\ No newline at end of file
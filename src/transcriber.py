@@ -24,8 +24,22 @@ class Transcriber:
         """音声ファイルを文字起こし"""
         # 基本的な文字起こし
         raw_text = await self.provider.transcribe(audio_file_path, language, guild_id)
-        
-        # 後処理の適用
+        return await self._postprocess(raw_text, guild_id)
+
+    async def transcribe_with_timestamps(
+        self, audio_file_path: str, language: str = "ja", guild_id: int = None
+    ) -> dict:
+        """タイムスタンプ付きで音声ファイルを文字起こし
+
+        全文には transcribe と同じ後処理を適用し、セグメントは話者割り当て用に元のまま返す
+        """
+        result = await self.provider.transcribe_with_timestamps(
+            audio_file_path, language, guild_id
+        )
+        return {**result, "text": await self._postprocess(result["text"], guild_id)}
+
+    async def _postprocess(self, raw_text: str, guild_id: Optional[int]) -> str:
+        """文字起こし結果に後処理を適用（エラーメッセージや無効時はそのまま返す）"""
         if self.enable_postprocessing and not raw_text.startswith("音声の文字起こしで"):
             try:
                 processed_text = await self.postprocessor.process_transcription(
@@ -45,14 +59,6 @@ class Transcriber:
         
         return raw_text
 
-    async def transcribe_with_timestamps(
-        self, audio_file_path: str, language: str = "ja", guild_id: int = None
-    ) -> dict:
-        """タイムスタンプ付きで音声ファイルを文字起こし"""
-        return await self.provider.transcribe_with_timestamps(
-            audio_file_path, language, guild_id
-        )
-
     def validate_api_key(self) -> bool:
         """APIキーの有効性をチェック"""
         return self.provider.validate_api_key()
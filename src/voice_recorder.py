@@ -1,22 +1,186 @@
 import asyncio
+import itertools
 import logging
 import os
-from datetime import datetime
+import shutil
+import struct
+import tempfile
+import time
+import wave
+from contextlib import ExitStack
 from pathlib import Path
+from typing import BinaryIO, List, Optional
 import discord
-from pydub import AudioSegment
-import io
+
+try:
+    import audioop
+except ImportError:
+    import pyaudioop as audioop
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 logger = logging.getLogger(__name__)
 
+# 音声データを含まないWAVファイルのサイズ（ヘッダーのみ）
+WAV_HEADER_BYTES = 44
+
+# ミックス時に一度に読み込むフレーム数（48kHzで約5秒分）
+MIX_CHUNK_FRAMES = 48000 * 5
+
+# 録音ファイルをコピーする際のバッファサイズ
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _mix_pcm(chunks: List[bytes], accumulator=None) -> bytes:
+    """16bit PCMのブロックを重ね合わせる（短いブロックは末尾を無音として扱う）
+
+    accumulator にはブロックごとに使い回すint32のNumPy配列を渡せる
+    """
+    if np is not None:
+        length = max(len(pcm) for pcm in chunks) // 2
+        if accumulator is None or accumulator.size < length:
+            accumulator = np.empty(length, dtype=np.int32)
+        # int32で合算し、最後に1回だけint16の範囲にクリップする（一時配列を作らずにその場で加算）
+        mixed = accumulator[:length]
+        mixed.fill(0)
+        for pcm in chunks:
+            samples = np.frombuffer(pcm, dtype='<i2')
+            target = mixed[:samples.size]
+            np.add(target, samples, out=target)
+        np.clip(mixed, -32768, 32767, out=mixed)
+        return mixed.astype('<i2').tobytes()
+    
+    # NumPyが無い場合はaudioopで32bitに広げて加算する（長さは無音で揃える）
+    # 16bitのまま加算すると途中の和ごとに飽和して音が歪むため、クリップは最後の1回だけにする
+    length = max(len(pcm) for pcm in chunks)
+    mixed = None
+    for pcm in chunks:
+        # lin2lin は値を上位ビットへ詰めるため、mul で元の値に戻して加算の余裕を確保する
+        widened = audioop.mul(audioop.lin2lin(pcm.ljust(length, b"\0"), 2, 4), 4, 1 / 65536)
+        mixed = widened if mixed is None else audioop.add(mixed, widened, 4)
+    # 16bitの範囲外の値は mul の飽和でクリップし、上位16bitを取り出す
+    return audioop.lin2lin(audioop.mul(mixed, 4, 65536), 4, 2)
+
+
+def _wav_header(data_size: int, channels: int, sampwidth: int, framerate: int) -> bytes:
+    """PCMデータ長に合わせたWAVヘッダー（44バイト）を作成"""
+    block_align = channels * sampwidth
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, framerate, framerate * block_align, block_align, sampwidth * 8,
+        b'data', data_size,
+    )
+
+
+def _track_size(track: BinaryIO) -> int:
+    """録音ファイル（BytesIO・一時ファイル）のサイズを取得"""
+    return track.seek(0, os.SEEK_END)
+
+
+def _save_track(track: BinaryIO, output_path: Path) -> None:
+    """1人分の録音（WAV）をそのまま保存"""
+    track.seek(0)
+    with open(output_path, 'wb') as f:
+        shutil.copyfileobj(track, f, COPY_BUFFER_SIZE)
+
+
+def _mix_wav_tracks(tracks: List[BinaryIO], output_path: Path) -> None:
+    """ユーザーごとのWAV（16bit PCM）を同じ時間軸で重ね合わせて保存
+
+    全体をデコード・コピーせず、録音バッファから一定フレーム数ずつ読み込み・合成・書き出しを繰り返す
+    """
+    with ExitStack() as stack:
+        readers = []
+        for track in tracks:
+            track.seek(0)
+            readers.append(stack.enter_context(wave.open(track, 'rb')))
+        params = readers[0].getparams()
+        if params.sampwidth != 2 or any(r.getparams()[:3] != params[:3] for r in readers):
+            raise ValueError("ユーザー間で音声フォーマットが一致しません")
+        
+        # 合算用のバッファは1ブロック分を確保して全ブロックで使い回す
+        accumulator = None
+        if np is not None:
+            accumulator = np.empty(MIX_CHUNK_FRAMES * params.nchannels, dtype=np.int32)
+        
+        with wave.open(str(output_path), 'wb') as writer:
+            writer.setparams(params)
+            while True:
+                chunks = [pcm for pcm in (r.readframes(MIX_CHUNK_FRAMES) for r in readers) if pcm]
+                if not chunks:
+                    break
+                # ヘッダーのフレーム数はブロックごとに書き換えず、close時に1回だけ確定させる
+                writer.writeframesraw(_mix_pcm(chunks, accumulator))
+
+
+class DiskWaveSink(discord.sinks.WaveSink):
+    """ユーザーごとの音声をメモリではなく一時ファイルに書き込むWaveSink
+
+    長時間の録音でもPCMデータがメモリに溜まらない。先頭にWAVヘッダー分の領域を確保しておき、
+    録音終了時に実際のデータ長でヘッダーを書き込む（標準のWaveSinkはPCMの先頭を
+    フレーム数0のヘッダーで上書きするため、wave・pydubでは空の音声として読まれる）
+
+    途中から話し始めたユーザーは録音開始から最初の音声までを無音で埋め、ミックス時の時間軸を揃える
+    （py-cordの sync_start は2.4に無く、新しいバージョンでは無視されるため使わない）
+    """
+
+    def init(self, vc):
+        super().init(vc)
+        # 各ユーザーの先頭の無音の長さを決める基準時刻
+        self.started_at = time.monotonic()
+
+    @discord.sinks.Filters.container
+    def write(self, data, user):
+        if user not in self.audio_data:
+            file = tempfile.TemporaryFile(prefix="recording_")
+            file.write(bytes(WAV_HEADER_BYTES))
+            self._write_leading_silence(file)
+            self.audio_data[user] = discord.sinks.AudioData(file)
+        self.audio_data[user].write(data)
+
+    def _write_leading_silence(self, file: BinaryIO) -> None:
+        """録音開始から最初の音声が届くまでの時間分の無音を書き込む"""
+        started_at = getattr(self, "started_at", None)
+        if started_at is None:
+            return
+        decoder = self.vc.decoder
+        remaining = int((time.monotonic() - started_at) * decoder.SAMPLING_RATE) * decoder.SAMPLE_SIZE
+        block = bytes(min(remaining, COPY_BUFFER_SIZE))
+        while remaining > 0:
+            file.write(block[:remaining])
+            remaining -= len(block)
+
+    def format_audio(self, audio):
+        if self.vc.recording:
+            raise discord.sinks.WaveSinkError(
+                "Audio may only be formatted after recording is finished."
+            )
+        decoder = self.vc.decoder
+        channels = decoder.CHANNELS
+        data_size = _track_size(audio.file) - WAV_HEADER_BYTES
+        audio.file.seek(0)
+        audio.file.write(_wav_header(
+            data_size, channels, decoder.SAMPLE_SIZE // channels, decoder.SAMPLING_RATE
+        ))
+        audio.file.seek(0)
+        audio.on_format(self.encoding)
+
 
 class VoiceRecorder:
+    # 録音ファイル名の連番（プロセス内で共有）
+    _sequence = itertools.count()
+    
     def __init__(self, output_dir: str = "recordings"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.sink = None
         self.recording_task = None
-        self.recording_finished = False
+        # 録音完了コールバックの通知（録音開始時にイベントループ上で作成）
+        self.recording_finished: Optional[asyncio.Event] = None
         
     async def start_recording(self, voice_client: discord.VoiceClient) -> None:
         """音声録音を開始"""
@@ -27,13 +191,14 @@ class VoiceRecorder:
             if not voice_client.channel:
                 raise Exception("Voice client is not connected to any channel.")
             
-            self.sink = discord.sinks.WaveSink()
-            self.recording_finished = False
+            self.sink = DiskWaveSink()
+            self.recording_finished = asyncio.Event()
             
             # 全てのチャンネルメンバーを録音対象に
             members = voice_client.channel.members
             logger.info(f"録音対象メンバー数: {len(members)}")
             
+            # 途中から話し始めたユーザーの先頭の無音はDiskWaveSinkが埋める
             voice_client.start_recording(
                 self.sink,
                 self._finished_callback,
@@ -50,18 +215,17 @@ class VoiceRecorder:
             # py-cordではis_recording()が存在しないため、録音状態チェックは呼び出し側で行う
             voice_client.stop_recording()
             
-            # 録音完了コールバックを待機（最大10秒）
-            wait_time = 0
-            while not self.recording_finished and wait_time < 10:
-                await asyncio.sleep(0.5)
-                wait_time += 0.5
+            # 録音完了コールバックを待機（最大10秒、呼ばれた時点ですぐに再開）
+            # コールバックはSinkが全ユーザーの音声データを書き終えた後に呼ばれるため、追加の待機は不要
+            if self.recording_finished is not None:
+                try:
+                    await asyncio.wait_for(self.recording_finished.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    pass
             
-            if not self.recording_finished:
+            if self.recording_finished is None or not self.recording_finished.is_set():
                 logger.warning("録音完了コールバックがタイムアウトしました")
             
-            # 追加の待機時間でデータが確実に書き込まれるまで待つ
-            await asyncio.sleep(1)
-            
             # 録音ファイルを結合して保存
             output_file = await self._merge_audio_files()
             logger.info(f"録音を停止し、ファイルを保存しました: {output_file}")
@@ -75,7 +239,8 @@ class VoiceRecorder:
         """録音完了時のコールバック"""
         logger.info("録音完了コールバックが呼ばれました")
         logger.info(f"録音データ数: {len(sink.audio_data) if sink.audio_data else 0}")
-        self.recording_finished = True
+        if self.recording_finished is not None:
+            self.recording_finished.set()
     
     async def _merge_audio_files(self) -> str:
         """複数の音声ファイルを結合して1つのファイルにする"""
@@ -87,36 +252,33 @@ class VoiceRecorder:
             # 空のファイルを作成する代わりに、エラーを投げる
             raise ValueError("録音データが見つかりません - マイクが有効か確認してください")
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = self.output_dir / f"recording_{timestamp}.wav"
+        # 同じ秒に複数の録音が停止してもファイル名が重複しないよう連番を付ける
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        output_file = self.output_dir / f"recording_{timestamp}_{next(self._sequence)}.wav"
+        
+        logger.info(f"処理する音声データ: {len(self.sink.audio_data)} ユーザー")
+        
+        # 録音データはメモリにコピーせず、ファイルオブジェクトのまま扱う
+        tracks = []
+        for user_id, audio_data in self.sink.audio_data.items():
+            data_size = _track_size(audio_data.file)
+            logger.info(f"ユーザー {user_id} の音声データサイズ: {data_size} バイト")
+            # WAVヘッダーしかない（マイクがミュートのまま等）ユーザーは除く
+            if data_size > WAV_HEADER_BYTES:
+                tracks.append(audio_data.file)
+        
+        if not tracks:
+            # ヘッダーだけのファイルを保存してもフォールバックできないため、ここでエラーにする
+            raise ValueError("有効な音声データが見つかりません")
         
         try:
-            logger.info(f"処理する音声データ: {len(self.sink.audio_data)} ユーザー")
-            
-            # 最大の音声データを持つユーザーを選択
-            largest_user_id = None
-            largest_size = 0
-            
-            for user_id, audio_data in self.sink.audio_data.items():
-                data_size = len(audio_data.file.getvalue())
-                logger.info(f"ユーザー {user_id} の音声データサイズ: {data_size} バイト")
-                
-                if data_size > largest_size:
-                    largest_size = data_size
-                    largest_user_id = user_id
-            
-            if largest_user_id is None or largest_size == 0:
-                raise ValueError("有効な音声データが見つかりません")
-            
-            # 最大のデータを持つユーザーの音声を保存
-            logger.info(f"ユーザー {largest_user_id} の音声データを使用 ({largest_size} バイト)")
-            
-            audio_data = self.sink.audio_data[largest_user_id]
-            raw_audio = audio_data.file.getvalue()
-            
-            # 直接WAVファイルとして保存
-            with open(output_file, 'wb') as f:
-                f.write(raw_audio)
+            # 合成・書き出しはワーカースレッドで実行（イベントループを塞がない）
+            if len(tracks) == 1:
+                # 音声が1人分だけなら合成は不要なので、WAVをそのまま保存
+                await asyncio.to_thread(_save_track, tracks[0], output_file)
+            else:
+                # 全ユーザーの音声をミックスしてWAVファイルとして保存
+                await asyncio.to_thread(_mix_wav_tracks, tracks, output_file)
             
             # ファイルサイズを確認
             file_size = output_file.stat().st_size
@@ -132,12 +294,9 @@ class VoiceRecorder:
             logger.error(f"音声ファイル処理エラー: {e}")
             # フォールバック: 最初のユーザーのデータのみ保存
             if self.sink.audio_data:
-                first_user_data = list(self.sink.audio_data.values())[0]
-                raw_data = first_user_data.file.getvalue()
-                logger.info(f"フォールバック処理: {len(raw_data)} バイトの音声データ")
-                
-                with open(output_file, 'wb') as f:
-                    f.write(raw_data)
+                first_user_data = next(iter(self.sink.audio_data.values()))
+                logger.info(f"フォールバック処理: {_track_size(first_user_data.file)} バイトの音声データ")
+                await asyncio.to_thread(_save_track, first_user_data.file, output_file)
                 
                 # ファイルサイズ確認
                 file_size = output_file.stat().st_size
@@ -153,11 +312,17 @@ class VoiceRecorder:
     def cleanup_old_recordings(self, max_age_days: int = 7) -> None:
         """古い録音ファイルを削除"""
         try:
-            current_time = datetime.now()
-            for file_path in self.output_dir.glob("recording_*.wav"):
-                file_age = current_time - datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_age.days > max_age_days:
-                    file_path.unlink()
-                    logger.info(f"古い録音ファイルを削除しました: {file_path}")
+            # 経過日数が max_age_days を超えたもの（max_age_days + 1 日以上前に更新）が対象
+            cutoff = time.time() - (max_age_days + 1) * 86400
+            # scandir はディレクトリ走査時に取得した属性を再利用できるため、ファイルごとの stat を減らせる
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not (name.startswith("recording_") and name.endswith(".wav")):
+                        continue
+                    # シンボリックリンクは辿らず、エントリ自身の更新日時で判定する
+                    if entry.stat(follow_symlinks=False).st_mtime <= cutoff:
+                        os.unlink(entry.path)
+                        logger.info(f"古い録音ファイルを削除しました: {entry.path}")
         except Exception as e:
             logger.error(f"録音ファイルクリーンアップエラー: {e}")
\ No newline at end of file
@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import Mock, patch, AsyncMock
+import os
+
+from openai import APIConnectionError
+
+from src.batch_provider import BatchOpenAIProvider
+from src.llm_providers import create_llm_provider
+
+
+@pytest.fixture
+def batch_provider():
+    """テスト用のBatchOpenAIProviderインスタンス（待ち時間なし）"""
+    provider = BatchOpenAIProvider(api_key="test_key_1234567890")
+    provider.batch_window = 0
+    provider.poll_interval = 0
+    return provider
+
+
+def make_output_line(custom_id, content):
+    """バッチ出力ファイルの1行を作成"""
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "body": {"choices": [{"message": {"content": content}}]},
+        },
+        "error": None,
+    })
+
+
+class TestBatchOpenAIProvider:
+    @pytest.mark.asyncio
+    async def test_requests_are_submitted_as_one_batch(self, batch_provider):
+        """同時のリクエストは1つのバッチにまとめ、結果を各呼び出し元へ返す"""
+        uploaded = {}
+
+        async def files_create(file, purpose):
+            uploaded["lines"] = [json.loads(line) for line in file[1].decode().splitlines()]
+            return Mock(id="file-input")
+
+        async def files_content(file_id):
+            lines = [
+                make_output_line(r["custom_id"], r["body"]["messages"][0]["content"] + "の結果")
+                for r in uploaded["lines"]
+            ]
+            return Mock(text="\n".join(lines))
+
+        client = batch_provider.client
+        in_progress = Mock(id="batch-1", status="in_progress")
+        completed = Mock(id="batch-1", status="completed",
+                         output_file_id="file-output", error_file_id=None)
+        with patch.object(client.files, 'create', side_effect=files_create), \
+             patch.object(client.files, 'content', side_effect=files_content), \
+             patch.object(client.batches, 'create', new_callable=AsyncMock,
+                          return_value=in_progress) as mock_batch_create, \
+             patch.object(client.batches, 'retrieve', new_callable=AsyncMock,
+                          return_value=completed):
+            results = await asyncio.gather(
+                batch_provider.generate_chat_completion([{"role": "user", "content": "質問1"}]),
+                batch_provider.generate_chat_completion([{"role": "user", "content": "質問2"}]),
+            )
+
+        assert results == ["質問1の結果", "質問2の結果"]
+        mock_batch_create.assert_awaited_once()
+        assert mock_batch_create.call_args.kwargs["endpoint"] == "/v1/chat/completions"
+        assert len(uploaded["lines"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_poll_error_resumes_same_batch(self, batch_provider):
+        """状態確認が一時的なエラーで失敗しても、同じバッチの確認を続けて結果を返す"""
+        batch_provider._dispatchers[0].max_retries = 0
+        client = batch_provider.client
+        in_progress = Mock(id="batch-1", status="in_progress")
+        completed = Mock(id="batch-1", status="completed",
+                         output_file_id="file-output", error_file_id=None)
+
+        uploaded = {}
+
+        async def files_create(file, purpose):
+            uploaded["custom_id"] = json.loads(file[1])["custom_id"]
+            return Mock(id="file-input")
+
+        async def files_content(file_id):
+            return Mock(text=make_output_line(uploaded["custom_id"], "回答"))
+
+        with patch.object(client.files, 'create', side_effect=files_create), \
+             patch.object(client.files, 'content', side_effect=files_content), \
+             patch.object(client.batches, 'create', new_callable=AsyncMock,
+                          return_value=in_progress), \
+             patch.object(client.batches, 'retrieve', new_callable=AsyncMock,
+                          side_effect=[APIConnectionError(request=Mock()), completed]) as mock_retrieve:
+            result = await batch_provider.generate_chat_completion(
+                [{"role": "user", "content": "質問"}]
+            )
+
+        assert result == "回答"
+        assert [call.args for call in mock_retrieve.call_args_list] == [("batch-1",), ("batch-1",)]
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_returns_error_message(self, batch_provider):
+        """バッチが失敗した場合はエラーメッセージを返す"""
+        client = batch_provider.client
+        failed = Mock(id="batch-1", status="failed", errors="invalid")
+        with patch.object(client.files, 'create', new_callable=AsyncMock,
+                          return_value=Mock(id="file-input")), \
+             patch.object(client.batches, 'create', new_callable=AsyncMock,
+                          return_value=failed):
+            result = await batch_provider.generate_chat_completion(
+                [{"role": "user", "content": "質問"}]
+            )
+
+        assert "チャット生成でAPIエラーが発生しました" in result
+
+    def test_parse_batch_record_error(self):
+        """失敗した行はエラーとして扱う"""
+        record = {"custom_id": "request-1", "response": {"status_code": 429, "body": {}}}
+
+        result = BatchOpenAIProvider._parse_batch_record(record)
+
+        assert isinstance(result, Exception)
+
+    def test_create_batch_provider(self):
+        """LLM_PROVIDER=openai-batch でバッチプロバイダーを作成"""
+        with patch.dict(os.environ, {'LLM_PROVIDER': 'openai-batch', 'OPENAI_API_KEY': 'test_key'}):
+            provider = create_llm_provider()
+            assert isinstance(provider, BatchOpenAIProvider)
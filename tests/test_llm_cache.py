@@ -0,0 +1,96 @@
+import pytest
+import os
+import time
+from unittest.mock import Mock, patch, AsyncMock
+
+from src.llm_cache import LLMCache, make_cache_key
+from src.llm_providers import OpenAIProvider
+
+
+class TestLLMCache:
+    def test_set_and_get(self, tmp_path):
+        """保存した値を取得できる"""
+        cache = LLMCache(str(tmp_path / "cache.sqlite3"))
+        cache.set("key", "値")
+
+        assert cache.get("key") == "値"
+        assert cache.get("missing") is None
+
+    def test_expired_entry_is_not_returned(self, tmp_path):
+        """期限切れのエントリは返さない"""
+        cache = LLMCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=-1)
+        cache.set("key", "値")
+
+        assert cache.get("key") is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """件数上限を超えると最終アクセスが古いものから削除する"""
+        cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        now = time.time()
+        with patch("src.llm_cache.time.time", side_effect=[now + i for i in range(4)]):
+            cache.set("a", "1")
+            cache.set("b", "2")
+            cache.get("a")
+            cache.set("c", "3")
+
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+
+    def test_make_cache_key_is_order_independent(self):
+        """キーは引数の順序に依存しない"""
+        assert make_cache_key(a=1, b="x") == make_cache_key(b="x", a=1)
+        assert make_cache_key(a=1) != make_cache_key(a=2)
+
+    @pytest.mark.asyncio
+    async def test_provider_reuses_cached_completion(self, tmp_path):
+        """同一リクエストはキャッシュから返しAPIを呼ばない"""
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider(api_key="test_key_1234567890")
+
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "生成されたテキスト"
+
+        with patch.object(provider.client.chat.completions, 'create',
+                         new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = mock_response
+            messages = [{"role": "user", "content": "テストメッセージ"}]
+
+            first = await provider.generate_chat_completion(messages)
+            second = await provider.generate_chat_completion(messages)
+
+        assert first == second == "生成されたテキスト"
+        mock_create.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_provider_reuses_cached_transcription(self, tmp_path):
+        """同一音声・同一プロンプトの文字起こしはキャッシュから返す"""
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider(api_key="test_key_1234567890")
+        provider.set_context_manager(Mock(get_context_enhanced_prompt=Mock(return_value="文脈A")))
+        audio_file = tmp_path / "audio.wav"
+        audio_file.write_bytes(b"fake_audio_data")
+
+        with patch.object(provider, '_enhance_audio_for_transcription',
+                         new_callable=AsyncMock, return_value=None), \
+             patch.object(provider.client.audio.transcriptions, 'create',
+                          new_callable=AsyncMock, return_value="文字起こし結果") as mock_create:
+            first = await provider.transcribe(str(audio_file), guild_id=1)
+            second = await provider.transcribe(str(audio_file), guild_id=1)
+            assert mock_create.call_count == 1
+
+            # 文脈プロンプトが変わった場合は再度文字起こしする
+            provider.context_manager.get_context_enhanced_prompt.return_value = "文脈B"
+            await provider.transcribe(str(audio_file), guild_id=1)
+
+        assert first == second == "文字起こし結果"
+        assert mock_create.call_count == 2
@@ -0,0 +1,89 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, AsyncMock
+
+import openai
+
+from src.llm_dispatcher import LLMDispatcher, estimate_tokens
+
+
+class TestLLMDispatcher:
+    @pytest.mark.asyncio
+    async def test_submit_returns_result(self):
+        """リクエスト結果をそのまま返す"""
+        dispatcher = LLMDispatcher()
+        request = AsyncMock(return_value="結果")
+
+        result = await dispatcher.submit(request, estimated_tokens=10)
+
+        assert result == "結果"
+        request.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_submit_retries_on_retryable_error(self):
+        """再試行対象のエラーはバックオフ後に再実行する"""
+        dispatcher = LLMDispatcher(max_retries=2, backoff_base=0)
+        request = AsyncMock(
+            side_effect=[openai.APIConnectionError(request=Mock()), "結果"]
+        )
+
+        result = await dispatcher.submit(request)
+
+        assert result == "結果"
+        assert request.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_submit_raises_after_max_retries(self):
+        """再試行上限を超えたらエラーを送出する"""
+        dispatcher = LLMDispatcher(max_retries=1, backoff_base=0)
+        request = AsyncMock(side_effect=openai.APIConnectionError(request=Mock()))
+
+        with pytest.raises(openai.APIConnectionError):
+            await dispatcher.submit(request)
+
+        assert request.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_submit_limits_concurrency(self):
+        """同時実行数を上限以下に抑える"""
+        dispatcher = LLMDispatcher(max_concurrent=2)
+        running = 0
+        peak = 0
+
+        async def request():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "ok"
+
+        await asyncio.gather(*[dispatcher.submit(request) for _ in range(6)])
+
+        assert peak == 2
+
+    def test_estimate_tokens(self):
+        """メッセージ長と最大トークン数から概算する"""
+        messages = [{"role": "user", "content": "あいうえお"}]
+        assert estimate_tokens(messages, max_tokens=100) == 105
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_error_pauses_other_requests(self):
+        """レート制限エラー後は他のリクエストも待機してから送信する"""
+        dispatcher = LLMDispatcher(max_retries=1, backoff_base=0.05)
+        rate_limited = openai.RateLimitError(
+            "rate limited", response=Mock(status_code=429), body=None
+        )
+        first = AsyncMock(side_effect=[rate_limited, "結果"])
+
+        task = asyncio.ensure_future(dispatcher.submit(first))
+        await asyncio.sleep(0)
+        assert dispatcher._paused_until > 0
+
+        second = AsyncMock(return_value="ok")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await dispatcher.submit(second)
+
+        assert loop.time() - started >= 0.04
+        assert await task == "結果"
@@ -3,8 +3,12 @@ import asyncio
 from unittest.mock import Mock, patch, AsyncMock
 import tempfile
 import os
+import time
+
+from openai import APIConnectionError
 
 from src.llm_providers import OpenAIProvider, GeminiProvider, create_llm_provider
+from src.llm_providers import _cleanup_temp_files, _remove_stale_workdirs, WORKDIR_PREFIX
 
 
 class TestOpenAIProvider:
@@ -14,6 +18,14 @@ class TestOpenAIProvider:
         assert provider.api_key == "test_key"
         assert provider.provider_name == "OpenAI"
     
+    def test_sdk_retries_disabled(self):
+        """再試行はディスパッチャーが行うため、SDKクライアント側の再試行は無効にする"""
+        with patch.dict(os.environ, {'OPENAI_API_KEYS': 'key_a_1234567890,key_b_1234567890'}):
+            provider = OpenAIProvider()
+        
+        assert len(provider._clients) == 2
+        assert all(client.max_retries == 0 for client in provider._clients)
+    
     def test_init_without_api_key_raises_error(self):
         """APIキーなしでのインスタンス作成はエラー"""
         with patch.dict(os.environ, {}, clear=True):
@@ -52,6 +64,196 @@ class TestOpenAIProvider:
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
     
+    @pytest.mark.asyncio
+    async def test_transcribe_retries_transient_errors(self, tmp_path):
+        """一時的な接続エラーはディスパッチャーで再試行する"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+        provider._dispatchers[0].backoff_base = 0
+        audio_path = tmp_path / "audio.wav"
+        audio_path.write_bytes(b"fake_audio_data")
+
+        with patch.object(provider, '_enhance_audio_for_transcription',
+                         new_callable=AsyncMock, return_value=None):
+            with patch.object(provider.client.audio.transcriptions, 'create',
+                             new_callable=AsyncMock) as mock_create:
+                mock_create.side_effect = [
+                    APIConnectionError(request=Mock()),
+                    "テスト文字起こし結果",
+                ]
+
+                result = await provider.transcribe(str(audio_path))
+
+        assert result == "テスト文字起こし結果"
+        assert mock_create.await_count == 2
+        assert mock_create.call_args.kwargs["file"] == ("audio.wav", b"fake_audio_data")
+
+    @pytest.mark.asyncio
+    async def test_transcribe_concurrent_same_file_is_coalesced(self):
+        """同一ファイルの同時文字起こしはAPI呼び出しを1回にまとめる"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            f.write(b"fake_audio_data")
+            temp_path = f.name
+
+        async def slow_create(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return "テスト文字起こし結果"
+
+        try:
+            with patch.object(provider, '_enhance_audio_for_transcription',
+                             new_callable=AsyncMock, return_value=None):
+                with patch.object(provider.client.audio.transcriptions, 'create',
+                                 new_callable=AsyncMock) as mock_create:
+                    mock_create.side_effect = slow_create
+
+                    results = await asyncio.gather(
+                        provider.transcribe(temp_path),
+                        provider.transcribe(temp_path),
+                    )
+
+                    assert results == ["テスト文字起こし結果"] * 2
+                    mock_create.assert_called_once()
+                    assert provider._inflight == {}
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    @pytest.mark.asyncio
+    async def test_transcribe_with_timestamps_is_coalesced_and_cached(self, tmp_path):
+        """タイムスタンプ付き文字起こしも同時リクエストを1回にまとめ、再実行時はキャッシュから返す"""
+        env = {"LLM_CACHE_ENABLED": "true", "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3")}
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider(api_key="test_key_1234567890")
+        audio_path = tmp_path / "audio.wav"
+        audio_path.write_bytes(b"fake_audio_data")
+        segment = Mock()
+        segment.model_dump.return_value = {"start": 0.0, "end": 2.0, "text": "テスト"}
+        transcription = Mock(text="テスト", segments=[segment], language="ja", duration=2.0)
+
+        async def slow_create(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return transcription
+
+        with patch.object(provider, '_enhance_audio_for_transcription',
+                         new_callable=AsyncMock, return_value=None), \
+             patch.object(provider.client.audio.transcriptions, 'create',
+                          new_callable=AsyncMock, side_effect=slow_create) as mock_create:
+            first, second = await asyncio.gather(
+                provider.transcribe_with_timestamps(str(audio_path)),
+                provider.transcribe_with_timestamps(str(audio_path)),
+            )
+            cached = await provider.transcribe_with_timestamps(str(audio_path))
+            await provider.transcribe(str(audio_path))
+
+        assert first is second
+        assert cached["text"] == "テスト"
+        assert cached["segments"] == [{"start": 0.0, "end": 2.0, "text": "テスト"}]
+        # 全文のみの文字起こしは別のキャッシュとして扱う
+        assert mock_create.call_count == 2
+        assert mock_create.call_args_list[0].kwargs["response_format"] == "verbose_json"
+
+    @pytest.mark.asyncio
+    async def test_transcribe_with_timestamps_errors_are_not_cached(self, tmp_path):
+        """失敗した結果（セグメントなし）はキャッシュしない"""
+        env = {"LLM_CACHE_ENABLED": "true", "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3")}
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider(api_key="test_key_1234567890")
+        audio_path = tmp_path / "audio.wav"
+        audio_path.write_bytes(b"fake_audio_data")
+
+        with patch.object(provider, '_enhance_audio_for_transcription',
+                         new_callable=AsyncMock, side_effect=RuntimeError("変換エラー")) as mock_enhance:
+            first = await provider.transcribe_with_timestamps(str(audio_path))
+            second = await provider.transcribe_with_timestamps(str(audio_path))
+
+        assert first["segments"] == second["segments"] == []
+        assert mock_enhance.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_transcribe_segments_uploads_by_path(self, tmp_path):
+        """セグメントはパスで渡し、SDK側で非同期に読み込ませる"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+        segment_file = tmp_path / "segment_0.mp3"
+        segment_file.write_bytes(b"fake_audio_data")
+        segments = [{"file_path": str(segment_file), "start_time": 0.0,
+                     "duration": 10.0, "segment_index": 0}]
+
+        with patch.object(provider.client.audio.transcriptions, 'create',
+                         new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = "セグメント結果"
+
+            result = await provider._transcribe_segments(segments)
+
+        assert "[00:00] セグメント結果" in result
+        assert mock_create.call_args.kwargs["file"] == segment_file
+
+    @pytest.mark.asyncio
+    async def test_transcribe_segments_concurrently(self, tmp_path):
+        """分割セグメントは並行して文字起こしし、元の順序で統合する"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+        segments = []
+        for i in range(3):
+            segment_file = tmp_path / f"segment_{i}.mp3"
+            segment_file.write_bytes(b"fake_audio_data")
+            segments.append({"file_path": str(segment_file), "start_time": i * 60.0,
+                             "duration": 60.0, "segment_index": i})
+        running = 0
+        peak = 0
+
+        async def slow_create(file, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            # 後ろのセグメントほど早く終わる
+            await asyncio.sleep(0.03 - 0.01 * int(file.stem[-1]))
+            running -= 1
+            return f"結果{file.stem[-1]}"
+
+        with patch.object(provider.client.audio.transcriptions, 'create',
+                         side_effect=slow_create):
+            result = await provider._transcribe_segments(segments)
+
+        assert peak == 3
+        assert result.endswith("[00:00] 結果0\n\n[01:00] 結果1\n\n[02:00] 結果2")
+
+    def test_providers_share_http_client(self):
+        """複数プロバイダー間でHTTP接続プールを共有する"""
+        provider1 = OpenAIProvider(api_key="test_key_1234567890")
+        provider2 = OpenAIProvider(api_key="test_key_0987654321")
+
+        assert provider1.client._client is provider2.client._client
+
+    def test_shared_http_client_enables_http2_when_available(self):
+        """h2 がインストールされていれば共有クライアントで HTTP/2 を有効化する"""
+        import src.llm_providers as llm_providers
+
+        with patch.object(llm_providers, '_shared_http_client', None):
+            with patch.dict('sys.modules', {'h2': Mock()}):
+                with patch.object(llm_providers, 'DefaultAsyncHttpxClient') as mock_client:
+                    llm_providers._get_shared_http_client()
+
+        assert mock_client.call_args.kwargs["http2"] is True
+
+    def test_multiple_api_keys_round_robin(self):
+        """OPENAI_API_KEYS 指定時はキーごとのクライアントを順番に使う"""
+        env = {"OPENAI_API_KEYS": "key_a_1234567890, key_b_1234567890"}
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider()
+
+        keys = [provider._next_client()[0].api_key for _ in range(4)]
+        assert keys == ["key_a_1234567890", "key_b_1234567890"] * 2
+
+    def test_whisper_parameters_default_temperature_zero(self):
+        """Whisperパラメータは既定で temperature=0.0 を明示する"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("WHISPER_TEMPERATURE", None)
+            params = provider._get_whisper_parameters("segment")
+
+        assert params["temperature"] == 0.0
+
     @pytest.mark.asyncio
     async def test_generate_chat_completion_success(self):
         """チャット生成成功ケース"""
@@ -71,6 +273,70 @@ class TestOpenAIProvider:
             assert result == "生成されたテキスト"
             mock_create.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_generate_chat_completion_stream(self):
+        """ストリーミング生成は差分を順に返す"""
+        provider = OpenAIProvider(api_key="test_key_1234567890")
+
+        def make_chunk(content):
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = content
+            return chunk
+
+        async def stream():
+            for content in ["生成", None, "された", "テキスト"]:
+                yield make_chunk(content)
+
+        with patch.object(provider.client.chat.completions, 'create',
+                         new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = stream()
+
+            messages = [{"role": "user", "content": "テストメッセージ"}]
+            deltas = [d async for d in provider.generate_chat_completion_stream(messages)]
+
+            assert deltas == ["生成", "された", "テキスト"]
+            assert mock_create.call_args.kwargs["stream"] is True
+
+
+class TestTempFileCleanup:
+    @pytest.mark.asyncio
+    async def test_cleanup_runs_in_background(self, tmp_path):
+        """一時ファイル・ディレクトリはバックグラウンドで削除される"""
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+        (workdir / "enhanced.wav").write_bytes(b"data")
+        temp_file = tmp_path / "compressed.mp3"
+        temp_file.write_bytes(b"data")
+
+        _cleanup_temp_files(workdir, temp_file, tmp_path / "missing.mp3")
+        for _ in range(100):
+            if not workdir.exists() and not temp_file.exists():
+                break
+            await asyncio.sleep(0.01)
+
+        assert not workdir.exists()
+        assert not temp_file.exists()
+
+    def test_remove_stale_workdirs(self, tmp_path):
+        """古い一時作業ディレクトリのみ削除する"""
+        stale = tmp_path / f"{WORKDIR_PREFIX}stale"
+        fresh = tmp_path / f"{WORKDIR_PREFIX}fresh"
+        other = tmp_path / "other_stale"
+        for path in (stale, fresh, other):
+            path.mkdir()
+        old = time.time() - 7200
+        os.utime(stale, (old, old))
+        os.utime(other, (old, old))
+
+        with patch("src.llm_providers.tempfile.gettempdir", return_value=str(tmp_path)):
+            removed = _remove_stale_workdirs(3600)
+
+        assert removed == 1
+        assert not stale.exists()
+        assert fresh.exists()
+        assert other.exists()
+
 
 class TestGeminiProvider:
     def test_init_with_api_key(self):
@@ -93,6 +359,26 @@ class TestGeminiProvider:
             with pytest.raises(ImportError, match="google-generativeai ライブラリがインストールされていません"):
                 GeminiProvider(api_key="test_key")
     
+    def test_resolved_model_is_reused(self):
+        """初期化に成功したモデルを次回のインスタンス作成で最初に試す"""
+        def generative_model(model_name):
+            if model_name == "gemini-1.5-flash":
+                raise ValueError("unavailable")
+            return Mock()
+
+        with patch.object(GeminiProvider, '_cached_model_name', None):
+            with patch('google.generativeai.configure'):
+                with patch('google.generativeai.GenerativeModel',
+                           side_effect=generative_model) as mock_model:
+                    GeminiProvider(api_key="test_key")
+                    assert mock_model.call_count == 2
+
+                    mock_model.reset_mock()
+                    provider = GeminiProvider(api_key="test_key")
+
+                    mock_model.assert_called_once_with("gemini-1.5-pro")
+                    assert provider.model_name == "gemini-1.5-pro"
+
     @pytest.mark.asyncio
     async def test_transcribe_not_supported(self):
         """音声転写は未サポート"""
@@ -111,18 +397,35 @@ class TestGeminiProvider:
             mock_model = Mock()
             mock_response = Mock()
             mock_response.text = "生成されたテキスト"
-            mock_model.generate_content = Mock(return_value=mock_response)
+            mock_model.generate_content_async = AsyncMock(return_value=mock_response)
             
             with patch('google.generativeai.GenerativeModel', return_value=mock_model):
                 provider = GeminiProvider(api_key="test_key")
                 
-                with patch('asyncio.get_event_loop') as mock_loop:
-                    mock_executor = AsyncMock(return_value=mock_response)
-                    mock_loop.return_value.run_in_executor = mock_executor
-                    
-                    result = await provider.generate_text("テストプロンプト")
-                    
-                    assert result == "生成されたテキスト"
+                result = await provider.generate_text("テストプロンプト")
+                
+                assert result == "生成されたテキスト"
+                mock_model.generate_content_async.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_generate_chat_completion_formats_roles(self):
+        """メッセージはロールごとの接頭辞を付けて1つのプロンプトにまとめる"""
+        with patch('google.generativeai.configure'):
+            with patch('google.generativeai.GenerativeModel'):
+                provider = GeminiProvider(api_key="test_key")
+
+        messages = [
+            {"role": "system", "content": "指示"},
+            {"role": "user", "content": "質問"},
+            {"role": "assistant", "content": "回答"},
+            {"role": "tool", "content": "無視"},
+        ]
+        with patch.object(provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = "結果"
+            await provider.generate_chat_completion(messages)
+
+        prompt = mock_generate.call_args.args[0]
+        assert prompt == "システム: 指示\n\nユーザー: 質問\n\nアシスタント: 回答"
 
 
 class TestCreateLLMProvider:
@@ -1,5 +1,6 @@
 import pytest
 import asyncio
+import json
 from unittest.mock import Mock, patch, AsyncMock
 import os
 
@@ -50,20 +51,127 @@ class TestMinutesGenerator:
     
     @pytest.mark.asyncio
     async def test_generate_success(self, minutes_generator, sample_transcription):
-        """議事録生成成功ケース"""
-        mock_response = Mock()
-        mock_response.choices = [Mock()]
-        mock_response.choices[0].message.content = "生成された議事録の内容です。"
-        
-        with patch.object(minutes_generator.provider, 'generate_chat_completion',
-                         new_callable=AsyncMock) as mock_generate:
-            mock_generate.return_value = "生成された議事録の内容です。"
-            
-            result = await minutes_generator.generate(sample_transcription)
-            
-            assert result == "生成された議事録の内容です。"
-            mock_generate.assert_called_once()
-    
+        """議事録生成成功ケース（必須見出しが揃ったドラフトはリファインしない）"""
+        draft = "# Discord会議 議事録\n\n## 会議要約\n- 要約\n\n## 重要ポイント\n- 進捗確認\n\n## 決定事項\n- なし\n\n## アクションアイテム\n- ドキュメント作成"
+
+        with patch.dict(os.environ, {"MINUTES_REFINE": "false"}):
+            with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                             new_callable=AsyncMock) as mock_generate:
+                mock_generate.return_value = draft
+
+                result = await minutes_generator.generate(sample_transcription)
+
+        assert result.startswith("# Discord会議 議事録\n\n**日時**: ")
+        assert result.endswith(draft.split("\n", 1)[1])
+        mock_generate.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_generate_refines_when_heading_missing(self, minutes_generator, sample_transcription):
+        """必須見出しが欠けたドラフトはリファインした結果を返す"""
+        draft = "# Discord会議 議事録\n\n## 会議要約\n- 要約\n\n## 重要ポイント\n- 進捗確認\n\n## アクションアイテム\n- ドキュメント作成"
+        refined = "# Discord会議 議事録\n\n## 会議要約\n- 要約\n\n## 重要ポイント\n- 進捗確認\n\n## 決定事項\n- 決定事項はありませんでした\n\n## アクションアイテム\n- ドキュメント作成"
+
+        with patch.dict(os.environ, {"MINUTES_REFINE": "false"}):
+            with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                             new_callable=AsyncMock) as mock_generate:
+                mock_generate.side_effect = [draft, refined]
+
+                result = await minutes_generator.generate(sample_transcription)
+
+        assert mock_generate.call_count == 2
+        assert "ドラフト議事録" in mock_generate.call_args.args[0][1]["content"]
+        assert result.endswith(refined.split("\n", 1)[1])
+
+    def test_needs_refine(self, minutes_generator):
+        """見出しの欠落、または MINUTES_REFINE で有効化されたときにリファインする"""
+        draft = "## 会議要約\n## 重要ポイント\n## 決定事項\n## アクションアイテム\n"
+
+        with patch.dict(os.environ, {"MINUTES_REFINE": "false"}):
+            assert minutes_generator._needs_refine(draft) is False
+            assert minutes_generator._needs_refine("## 会議要約\n") is True
+        with patch.dict(os.environ, {"MINUTES_REFINE": "true"}):
+            assert minutes_generator._needs_refine(draft) is True
+
+    @pytest.mark.asyncio
+    async def test_generate_with_progress_callback_streams(self, minutes_generator, sample_transcription):
+        """進捗コールバック指定時はストリーミングで生成し途中経過を通知する"""
+        async def stream(*args, **kwargs):
+            for delta in ["生成された", "議事録の", "内容です。"]:
+                yield delta
+
+        progress = AsyncMock()
+        with patch.object(minutes_generator.provider, 'generate_chat_completion_stream',
+                         side_effect=stream):
+            with patch.object(minutes_generator, '_refine_minutes',
+                             new_callable=AsyncMock, return_value=None):
+                result = await minutes_generator.generate(
+                    sample_transcription, progress_callback=progress
+                )
+
+        assert result == "生成された議事録の内容です。"
+        progress.assert_awaited_once_with("生成された")
+
+    @pytest.mark.asyncio
+    async def test_stream_stops_at_end_marker(self, minutes_generator):
+        """アクションアイテムの後の終端行で生成を打ち切る"""
+        consumed = []
+
+        async def stream(*args, **kwargs):
+            for delta in ["# 会議 議事録\n\n---\n## アクションアイテム\n", "- タスク\n", "---\n", "*注記*"]:
+                consumed.append(delta)
+                yield delta
+
+        with patch.object(minutes_generator.provider, 'generate_chat_completion_stream',
+                         side_effect=stream):
+            result = await minutes_generator._stream_chat_completion(
+                [], AsyncMock(), max_tokens=2000, temperature=0.2
+            )
+
+        assert result == "# 会議 議事録\n\n---\n## アクションアイテム\n- タスク"
+        assert "*注記*" not in consumed
+
+    @pytest.mark.asyncio
+    async def test_generate_stops_stream_at_instructed_end_line(self, minutes_generator, sample_transcription):
+        """プロンプトで指示した「以上」の行で打ち切り、その後の出力は読まずに捨てる"""
+        consumed = []
+        deltas = [
+            "# Discord会議 議事録\n\n## 会議要約\n- 要約\n\n## 重要ポイント\n- 進捗確認\n\n",
+            "## 決定事項\n- なし\n\n## アクションアイテム\n- ドキュメント作成\n",
+            "以上\n",
+            "補足: この議事録は自動生成されました。\n",
+        ]
+
+        async def stream(messages, **kwargs):
+            assert "「以上」とだけ書いた1行で終える" in messages[1]["content"]
+            for delta in deltas:
+                consumed.append(delta)
+                yield delta
+
+        with patch.dict(os.environ, {"MINUTES_REFINE": "false"}):
+            with patch.object(minutes_generator.provider, 'generate_chat_completion_stream',
+                             side_effect=stream):
+                with patch.object(minutes_generator, '_refine_minutes',
+                                 new_callable=AsyncMock) as mock_refine:
+                    result = await minutes_generator.generate(
+                        sample_transcription, progress_callback=AsyncMock()
+                    )
+
+        assert result.endswith("## アクションアイテム\n- ドキュメント作成")
+        assert deltas[3] not in consumed
+        mock_refine.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_generate_strips_end_line_without_streaming(self, minutes_generator, sample_transcription):
+        """一括生成でも終端行とそれ以降は議事録に含めない"""
+        draft = "# Discord会議 議事録\n\n## 会議要約\n- 要約\n\n## 重要ポイント\n- 進捗確認\n\n## 決定事項\n- なし\n\n## アクションアイテム\n- ドキュメント作成\n\n以上"
+
+        with patch.dict(os.environ, {"MINUTES_REFINE": "false"}):
+            with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                             new_callable=AsyncMock, return_value=draft):
+                result = await minutes_generator.generate(sample_transcription)
+
+        assert result.endswith("## アクションアイテム\n- ドキュメント作成")
+
     @pytest.mark.asyncio
     async def test_generate_empty_transcription(self, minutes_generator):
         """空の文字起こしデータ"""
@@ -88,9 +196,32 @@ class TestMinutesGenerator:
     
     @pytest.mark.asyncio
     async def test_generate_detailed_success(self, minutes_generator, sample_transcription):
-        """詳細議事録生成成功ケース"""
-        # 各API呼び出しのモックレスポンス
+        """詳細議事録生成成功ケース（4項目を1回のリクエストで生成）"""
+        mock_response = json.dumps({
+            "summary": "プロジェクトの進捗確認と来週の計画立てについて議論しました。",
+            "action_items": ["山田さん：来週までにドキュメント作成", "佐藤さん：テスト準備"],
+            "key_points": "- プロジェクト進捗の確認\n- 来週の計画立案",
+            "decisions": "- 来週の計画を立てることに決定",
+        }, ensure_ascii=False)
+
+        with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                         new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = f"```json\n{mock_response}\n```"
+
+            result = await minutes_generator.generate_detailed(sample_transcription)
+
+            mock_generate.assert_called_once()
+            assert mock_generate.call_args.kwargs["json_mode"] is True
+            assert "プロジェクトの進捗確認" in result["summary"]
+            assert "- 山田さん：来週までにドキュメント作成" in result["action_items"]
+            assert "来週の計画を立てることに決定" in result["full_minutes"]
+
+    @pytest.mark.asyncio
+    async def test_generate_detailed_falls_back_to_separate_requests(self, minutes_generator, sample_transcription):
+        """一括生成のJSONが解析できない場合は項目ごとに生成する"""
+        # 各API呼び出しのモックレスポンス（先頭は一括生成への非JSON応答）
         mock_responses = [
+            "JSONではない応答",
             "プロジェクトの進捗確認と来週の計画立てについて議論しました。",  # summary
             "• 山田さん：来週までにドキュメント作成\n• 佐藤さん：テスト準備",  # action_items
             "• プロジェクト進捗の確認\n• 来週の計画立案",  # key_points
@@ -115,6 +246,101 @@ class TestMinutesGenerator:
             assert "プロジェクトの進捗確認" in result["summary"]
             assert "山田さん：来週までにドキュメント作成" in result["action_items"]
     
+    @pytest.mark.asyncio
+    async def test_generate_detailed_reuses_cache(self, sample_transcription, tmp_path):
+        """同じ文字起こしの再生成はLLMキャッシュから返しAPIを呼ばない"""
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            generator = MinutesGenerator(provider=OpenAIProvider(api_key="test_key_1234567890"))
+
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "summary": "要約",
+            "action_items": ["ドキュメント作成"],
+            "key_points": "- 進捗確認",
+            "decisions": "- なし",
+        }, ensure_ascii=False)
+
+        with patch.object(generator.provider.client.chat.completions, 'create',
+                         new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = mock_response
+
+            first = await generator.generate_detailed(sample_transcription)
+            second = await generator.generate_detailed(sample_transcription)
+
+        mock_create.assert_called_once()
+        assert first["summary"] == second["summary"] == "要約"
+
+    @pytest.mark.asyncio
+    async def test_stream_cut_at_end_line_is_cached(self, sample_transcription, tmp_path):
+        """終端行で打ち切ったストリーミング生成もキャッシュし、再生成時はAPIを呼ばない"""
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            generator = MinutesGenerator(provider=OpenAIProvider(api_key="test_key_1234567890"))
+
+        def make_chunk(content):
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = content
+            return chunk
+
+        async def stream():
+            for content in ["# 会議 議事録\n## アクションアイテム\n", "- タスク\n", "以上\n", "補足\n"]:
+                yield make_chunk(content)
+
+        messages = [{"role": "user", "content": sample_transcription}]
+        with patch.object(generator.provider.client.chat.completions, 'create',
+                         new_callable=AsyncMock) as mock_create:
+            mock_create.side_effect = lambda **kwargs: stream()
+
+            first = await generator._stream_chat_completion(
+                messages, AsyncMock(), max_tokens=2000, temperature=0.2
+            )
+            second = await generator._stream_chat_completion(
+                messages, AsyncMock(), max_tokens=2000, temperature=0.2
+            )
+
+        mock_create.assert_called_once()
+        assert first == second == "# 会議 議事録\n## アクションアイテム\n- タスク"
+
+    def test_split_into_chunks(self, minutes_generator):
+        """文境界でチャンク分割し、前チャンク末尾を重ねる"""
+        text = "".join(f"これは{i:03d}番目の文です。" for i in range(100))
+
+        chunks = minutes_generator._split_into_chunks(text, 300, overlap=50)
+
+        assert len(chunks) > 1
+        assert all(chunk.endswith("。") for chunk in chunks)
+        assert all(len(chunk) <= 300 for chunk in chunks)
+        # 直前チャンクの末尾の文が次チャンクに引き継がれる
+        last_sentence = chunks[0].split("。")[-2] + "。"
+        assert last_sentence in chunks[1][:50]
+
+    @pytest.mark.asyncio
+    async def test_condense_long_transcription_in_parallel(self, minutes_generator):
+        """長文はチャンクごとに並列要約して結合する"""
+        text = "".join(f"これは{i:03d}番目の文です。" for i in range(1000))
+
+        minutes_generator._max_chars = 6000
+        minutes_generator._target_chars = 4000
+
+        with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                         new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = "要約"
+
+            result = await minutes_generator._maybe_condense_transcription(text)
+
+        chunks = minutes_generator._split_into_chunks(text, 4000)
+        assert mock_generate.call_count == len(chunks)
+        assert result == "\n".join(["要約"] * len(chunks))
+
     def test_create_minutes_prompt(self, minutes_generator):
         """議事録プロンプト作成"""
         transcription = "テスト会話内容"
@@ -126,6 +352,73 @@ class TestMinutesGenerator:
         assert transcription in prompt
         assert "議事録:" in prompt
     
+    @pytest.mark.asyncio
+    async def test_refine_sends_facts_instead_of_transcript(self, minutes_generator, sample_transcription):
+        """十分な長さのドラフトのリファインでは原文の代わりに主要語彙・数値を渡す"""
+        draft = "## 会議要約\n" + "- 山田さんがドキュメントを作成する。\n" * 30
+
+        with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                         new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = draft
+            await minutes_generator._refine_minutes(draft, sample_transcription, "会議")
+
+        prompt = mock_generate.call_args.args[0][1]["content"]
+        assert "【原文の主要語彙・数値】" in prompt
+        assert "山田" in prompt
+        assert sample_transcription not in prompt
+
+    def test_timestamp_is_passed_through(self, minutes_generator):
+        """指定した日時をそのまま使用する"""
+        timestamp = "2024年01月02日 03:04"
+
+        minutes = minutes_generator._format_detailed_minutes(
+            "会議", "要約", "重要", "決定", "アクション", timestamp
+        )
+        inserted = minutes_generator._insert_timestamp("# 会議 議事録\n\n## 会議要約", timestamp)
+
+        assert f"**日時**: {timestamp}" in minutes
+        assert inserted == f"# 会議 議事録\n\n**日時**: {timestamp}\n\n## 会議要約"
+
+    def test_prompts_keep_fixed_prefix(self, minutes_generator):
+        """プロンプトは日時を含まず、固定指示の後ろに会議ごとの内容を置く"""
+        prompt1 = minutes_generator._create_minutes_prompt("内容A", "会議A")
+        prompt2 = minutes_generator._create_minutes_prompt("内容B", "会議B")
+
+        assert "日時" not in prompt1
+        prefix = prompt1[:prompt1.index("会議A")]
+        assert prompt2.startswith(prefix)
+        assert prompt1.index("## アクションアイテム") < prompt1.index("内容A")
+
+    @pytest.mark.asyncio
+    async def test_separate_sections_share_transcription_prefix(self, minutes_generator):
+        """個別生成の4リクエストは文字起こしまでが同一の接頭辞になる"""
+        with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                         new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = "結果"
+            await minutes_generator._generate_summary("文字起こし本文", "会議")
+            await minutes_generator._generate_action_items("文字起こし本文")
+            await minutes_generator._generate_key_points("文字起こし本文")
+            await minutes_generator._generate_decisions("文字起こし本文")
+
+        prefixes = {
+            (call.args[0][0]["content"], call.args[0][1]["content"].split("\n\n")[0])
+            for call in mock_generate.call_args_list
+        }
+        assert len(prefixes) == 1
+
+    @pytest.mark.asyncio
+    async def test_max_tokens_scale_with_transcription_length(self, minutes_generator):
+        """出力トークン上限は入力の長さに応じて下限・上限の範囲で決まる"""
+        with patch.object(minutes_generator.provider, 'generate_chat_completion',
+                         new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = "結果"
+            await minutes_generator._generate_action_items("短い会議")
+            await minutes_generator._generate_action_items("あ" * 1800)
+            await minutes_generator._generate_action_items("あ" * 10000)
+
+        budgets = [call.kwargs["max_tokens"] for call in mock_generate.call_args_list]
+        assert budgets == [150, 300, 400]
+
     def test_format_detailed_minutes(self, minutes_generator):
         """詳細議事録フォーマット"""
         title = "テスト会議"
@@ -0,0 +1,224 @@
+import pytest
+import json
+from unittest.mock import Mock, patch, AsyncMock
+import os
+
+from src.sentiment_analyzer import SentimentAnalyzer, SentimentInfo
+
+
+@pytest.fixture
+def analyzer():
+    """テスト用のSentimentAnalyzerインスタンス（ルールベース）"""
+    return SentimentAnalyzer()
+
+
+class TestSentimentAnalyzer:
+    def test_basic_sentiment_positive(self, analyzer):
+        """ポジティブなキーワードを検出"""
+        result = analyzer._basic_sentiment_analysis("素晴らしい結果で嬉しいです")
+
+        assert result.sentiment == 'positive'
+        assert result.emotions['joy'] == 2
+        assert result.emotions['factual'] == 0.5
+
+    def test_basic_sentiment_negative_with_intensity(self, analyzer):
+        """強度修飾語でスコアが強調される"""
+        result = analyzer._basic_sentiment_analysis("本当に心配だ")
+
+        assert result.sentiment == 'negative'
+        assert result.confidence == pytest.approx(2 / 3)
+
+    def test_basic_sentiment_uses_strongest_intensity(self, analyzer):
+        """複数の強度修飾語があれば、出現順に関係なく最も強いものを使う"""
+        result = analyzer._basic_sentiment_analysis("少し本当に心配だ")
+
+        assert result.confidence == pytest.approx(2 / 3)
+
+    def test_basic_sentiment_neutral(self, analyzer):
+        """感情キーワードがなければニュートラル"""
+        result = analyzer._basic_sentiment_analysis("資料を共有する")
+
+        assert result.sentiment == 'neutral'
+        assert result.confidence == 0.3
+        assert result.emotions == {}
+
+    def test_find_keywords_detects_overlapping_keywords(self, analyzer):
+        """重なり合うキーワードもすべて検出する"""
+        assert {'確認', '確認したい', 'すごい'} <= analyzer._find_keywords("すごい確認したい")
+
+    @pytest.mark.asyncio
+    async def test_analyze_sentences_batches_ai_requests(self):
+        """AI感情分析は複数文を1リクエストにまとめて並行実行する"""
+        provider = Mock()
+
+        async def generate(messages, **kwargs):
+            lines = messages[0]["content"].split("テキスト:\n", 1)[1].splitlines()
+            results = [{"i": i, "sentiment": "positive", "confidence": 0.8,
+                        "emotions": {"喜び": 0.7}} for i in range(len(lines))]
+            return json.dumps({"results": results}, ensure_ascii=False)
+
+        provider.generate_chat_completion = AsyncMock(side_effect=generate)
+        analyzer = SentimentAnalyzer(llm_provider=provider)
+        text = "。".join(f"これは{i:02d}番目の発言です" for i in range(45))
+
+        results = await analyzer._analyze_sentences(text)
+
+        assert provider.generate_chat_completion.await_count == 3
+        assert provider.generate_chat_completion.call_args.kwargs["json_mode"] is True
+        assert len(results) == 45
+        assert results[44].text == "これは44番目の発言です"
+        assert results[44].emotions == {"喜び": 0.7}
+
+    @pytest.mark.asyncio
+    async def test_analyze_sentences_deduplicates_before_ai(self):
+        """同じ文は1回だけAIに送り、結果を全ての出現箇所に反映する"""
+        provider = Mock()
+
+        async def generate(messages, **kwargs):
+            lines = messages[0]["content"].split("テキスト:\n", 1)[1].splitlines()
+            results = [{"i": i, "sentiment": "neutral", "confidence": 0.5}
+                       for i in range(len(lines))]
+            return json.dumps({"results": results})
+
+        provider.generate_chat_completion = AsyncMock(side_effect=generate)
+        analyzer = SentimentAnalyzer(llm_provider=provider)
+
+        results = await analyzer._analyze_sentences("なるほどですね。資料を確認します。なるほどですね。")
+
+        prompt = provider.generate_chat_completion.call_args.args[0][0]["content"]
+        assert prompt.count("なるほどですね") == 1
+        assert [r.text for r in results] == ["なるほどですね", "資料を確認します", "なるほどですね"]
+
+    def test_parse_ai_sentiments_ignores_invalid_items(self, analyzer):
+        """解析できない項目は None のまま残す"""
+        response = '```json\n{"results": [{"i": 1, "sentiment": "unknown", "confidence": 0.4}, {"i": 5}]}\n```'
+
+        results = analyzer._parse_ai_sentiments(["一つ目", "二つ目"], response)
+
+        assert results[0] is None
+        assert results[1].sentiment == "neutral"
+        assert results[1].confidence == 0.4
+
+    def test_create_meeting_summary(self, analyzer):
+        """感情比率と信頼度の高い発言を集計する"""
+        sentiments = [
+            SentimentInfo(text=f"前向き{i}", sentiment='positive', confidence=0.8, emotions={})
+            for i in range(4)
+        ] + [
+            SentimentInfo(text="懸念", sentiment='negative', confidence=0.9, emotions={}),
+            SentimentInfo(text="軽い懸念", sentiment='negative', confidence=0.5, emotions={}),
+            SentimentInfo(text="事実", sentiment='neutral', confidence=0.3, emotions={}),
+            SentimentInfo(text="前向き低", sentiment='positive', confidence=0.6, emotions={}),
+        ]
+
+        summary = analyzer._create_meeting_summary(sentiments, {})
+
+        assert summary.overall_sentiment == 'positive'
+        assert summary.positive_ratio == 5 / 8
+        assert summary.negative_ratio == 2 / 8
+        assert summary.neutral_ratio == 1 / 8
+        assert summary.key_positive_moments == ["前向き0", "前向き1", "前向き2"]
+        assert summary.key_negative_moments == ["懸念"]
+
+    @pytest.mark.asyncio
+    async def test_speaker_sentiments_batched_per_speaker(self):
+        """話者ごとに発言をまとめて1リクエストで分析し、失敗分はルールベースで補う"""
+        provider = Mock()
+
+        async def generate(messages, **kwargs):
+            lines = messages[0]["content"].split("テキスト:\n", 1)[1].splitlines()
+            if lines[0].endswith("資料を共有する"):
+                return "エラー"
+            results = [{"i": i, "sentiment": "positive", "confidence": 1.0}
+                       for i in range(len(lines))]
+            return json.dumps({"results": results})
+
+        provider.generate_chat_completion = AsyncMock(side_effect=generate)
+        analyzer = SentimentAnalyzer(llm_provider=provider)
+        segments = [
+            Mock(user_name="山田", text="賛成です"),
+            Mock(user_name="佐藤", text="資料を共有する"),
+            Mock(user_name="山田", text="いいですね"),
+        ]
+
+        result = await analyzer._analyze_speaker_sentiments(segments)
+
+        assert provider.generate_chat_completion.await_count == 2
+        assert result["山田"]["positive"] == 1.0
+        assert result["佐藤"]["neutral"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_analyze_sentences_splits_on_all_boundaries(self, analyzer):
+        """句点以外の感嘆符・疑問符・改行でも文を区切り、短すぎる文は除く"""
+        text = "本当に素晴らしい結果です！次の課題は何でしょうか？\n資料を共有しておきます。はい。"
+
+        results = await analyzer._analyze_sentences(text)
+
+        assert [r.text for r in results] == [
+            "本当に素晴らしい結果です", "次の課題は何でしょうか", "資料を共有しておきます"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_ai_sentiments_are_cached_per_sentence(self, tmp_path):
+        """分析済みの文はキャッシュから返し、未分析の文だけをAIに送る"""
+        provider = Mock(provider_name="OpenAI", chat_model="gpt-4o")
+
+        async def generate(messages, **kwargs):
+            lines = messages[0]["content"].split("テキスト:\n", 1)[1].splitlines()
+            results = [{"i": i, "sentiment": "positive", "confidence": 0.8}
+                       for i in range(len(lines))]
+            return json.dumps({"results": results})
+
+        provider.generate_chat_completion = AsyncMock(side_effect=generate)
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            analyzer = SentimentAnalyzer(llm_provider=provider)
+
+        await analyzer._ai_sentiment_analysis_batch(["お疲れさまです", "了解しました"])
+        results = await analyzer._ai_sentiment_analysis_batch(["了解しました", "新しい発言です"])
+
+        assert provider.generate_chat_completion.await_count == 2
+        last_prompt = provider.generate_chat_completion.call_args.args[0][0]["content"]
+        assert "了解しました" not in last_prompt
+        assert [r.text for r in results] == ["了解しました", "新しい発言です"]
+        assert results[0].sentiment == "positive"
+
+    @pytest.mark.asyncio
+    async def test_ai_sentiment_cache_is_per_model(self, tmp_path):
+        """モデルを変更したらキャッシュ済みの分析結果は使わない"""
+        provider = Mock(provider_name="OpenAI", chat_model="gpt-4o")
+
+        async def generate(messages, **kwargs):
+            lines = messages[0]["content"].split("テキスト:\n", 1)[1].splitlines()
+            results = [{"i": i, "sentiment": "positive", "confidence": 0.8}
+                       for i in range(len(lines))]
+            return json.dumps({"results": results})
+
+        provider.generate_chat_completion = AsyncMock(side_effect=generate)
+        env = {
+            "LLM_CACHE_ENABLED": "true",
+            "LLM_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+        }
+        with patch.dict(os.environ, env):
+            analyzer = SentimentAnalyzer(llm_provider=provider)
+
+        await analyzer._ai_sentiment_analysis_batch(["了解しました"])
+        provider.chat_model = "gpt-4o-mini"
+        await analyzer._ai_sentiment_analysis_batch(["了解しました"])
+
+        assert provider.generate_chat_completion.await_count == 2
+
+    def test_format_sentiment_analysis(self, analyzer):
+        """全体の雰囲気と話者ごとの優勢な感情を表示する"""
+        meeting_sentiment = analyzer._create_meeting_summary(
+            [SentimentInfo(text="前向き", sentiment='positive', confidence=0.8, emotions={})],
+            {"山田": {"positive": 0.25, "negative": 0.6, "neutral": 0.15}},
+        )
+
+        formatted = analyzer.format_sentiment_analysis(meeting_sentiment)
+
+        assert "🎭 **全体的な雰囲気**: 😊 positive" in formatted
+        assert "  😟 山田: negative (60.0%)" in formatted
@@ -0,0 +1,180 @@
+import pytest
+import io
+from unittest.mock import Mock, patch
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from src.speaker_analyzer import SpeakerAnalyzer, SpeakerSegment
+
+
+@pytest.fixture
+def speaker_analyzer(tmp_path):
+    """テスト用のSpeakerAnalyzerインスタンス（音量閾値によるVAD）"""
+    analyzer = SpeakerAnalyzer(output_dir=str(tmp_path / "recordings"))
+    analyzer.vad_mode = None
+    return analyzer
+
+
+def make_tone(duration):
+    """発言の代わりにする音声（440Hz）"""
+    return Sine(440, sample_rate=48000).to_audio_segment(duration=duration, volume=-10)
+
+
+def make_silence(duration):
+    """無音区間"""
+    return AudioSegment.silent(duration=duration, frame_rate=48000)
+
+
+class TestSpeakerAnalyzer:
+    def test_detect_voice_activity(self, speaker_analyzer):
+        """音量が閾値を超える区間を発言として検出し、短すぎる区間は除く"""
+        audio = make_silence(500) + make_tone(1500) + make_silence(800) + make_tone(300) + make_silence(500)
+
+        segments = speaker_analyzer._detect_voice_activity(audio)
+
+        assert segments == [(0.5, 2.0)]
+
+    def test_detect_voice_activity_until_end(self, speaker_analyzer):
+        """末尾まで続く発言は音声の終端で区切る"""
+        audio = make_silence(300) + make_tone(1250)
+
+        assert speaker_analyzer._detect_voice_activity(audio) == [(0.3, 1.55)]
+
+    def test_chunk_levels_match_pydub(self, speaker_analyzer):
+        """チャンクごとの音量はpydubのdBFSと一致する"""
+        audio = (make_silence(200) + make_tone(350)).set_channels(2)
+
+        levels = speaker_analyzer._chunk_levels(audio, 100)
+
+        expected = [audio[i:i + 100].dBFS for i in range(0, 500, 100)]
+        assert levels == pytest.approx(expected)
+
+    def test_detect_voice_activity_with_webrtc_vad(self, speaker_analyzer):
+        """WebRTC VADが使える場合は16kHzモノラルの30msフレームごとに判定する"""
+        frames = []
+
+        def is_speech(frame, sample_rate):
+            frames.append((len(frame), sample_rate))
+            return 10 <= len(frames) <= 60
+
+        speaker_analyzer.vad_mode = 2
+        audio = make_silence(3000).set_channels(2)
+
+        with patch('src.speaker_analyzer.webrtcvad') as mock_webrtcvad:
+            mock_webrtcvad.Vad.return_value = Mock(is_speech=Mock(side_effect=is_speech))
+            segments = speaker_analyzer._detect_voice_activity(audio)
+
+        mock_webrtcvad.Vad.assert_called_once_with(2)
+        assert len(frames) == 100
+        assert set(frames) == {(960, 16000)}
+        assert segments == [(0.27, 1.8)]
+
+    @pytest.mark.asyncio
+    async def test_webrtc_vad_created_per_track(self, speaker_analyzer):
+        """話者ごとのスレッドでVadの状態を共有しないよう、トラックごとに作成する"""
+        speaker_analyzer.vad_mode = 3
+        audio = make_silence(300)
+
+        with patch('src.speaker_analyzer.webrtcvad') as mock_webrtcvad:
+            mock_webrtcvad.Vad.side_effect = lambda mode: Mock(is_speech=Mock(return_value=False))
+            activities = await speaker_analyzer._detect_speech_activities({1: audio, 2: audio})
+
+        assert activities == {1: [], 2: []}
+        assert mock_webrtcvad.Vad.call_count == 2
+        assert all(call.args == (3,) for call in mock_webrtcvad.Vad.call_args_list)
+
+    def test_assign_timed_segments_by_overlap(self, speaker_analyzer):
+        """タイムスタンプ付きセグメントは発言区間の重なりが最大の話者に割り当てる"""
+        participants = [Mock(id=1, display_name="山田"), Mock(id=2, display_name="佐藤")]
+        activities = {1: [(0.0, 3.0), (8.0, 10.0)], 2: [(2.5, 7.5)]}
+        transcript_segments = [
+            {"start": 0.2, "end": 2.8, "text": "始めます。"},
+            Mock(start=2.0, end=2.6, text="進捗は順調です。"),
+            {"start": 3.2, "end": 7.0, "text": "資料を共有します。"},
+            {"start": 8.2, "end": 9.8, "text": "了解です。"},
+            {"start": 10.1, "end": 11.0, "text": "以上です。"},
+        ]
+
+        segments = speaker_analyzer._assign_timed_segments_to_speakers(
+            transcript_segments, activities, participants
+        )
+
+        assert [(s.user_name, s.text) for s in segments] == [
+            ("山田", "始めます。進捗は順調です。"),
+            ("佐藤", "資料を共有します。"),
+            ("山田", "了解です。以上です。"),
+        ]
+        assert (segments[0].start_time, segments[0].end_time) == (0.2, 2.8)
+        assert segments[2].end_time == 11.0
+
+    @pytest.mark.asyncio
+    async def test_extract_individual_audio_in_memory(self, speaker_analyzer, tmp_path, monkeypatch):
+        """個別音声は一時ファイルに書き出さずAudioSegmentのまま返し、デコードできない音声や無音の音声は除く"""
+        def make_audio_data(audio):
+            buffer = io.BytesIO()
+            audio.export(buffer, format="wav")
+            return Mock(file=buffer)
+
+        sink = Mock(audio_data={
+            1: make_audio_data(make_tone(1500)),
+            2: make_audio_data(make_tone(300)),
+            3: make_audio_data(make_tone(1500)),
+            4: Mock(file=io.BytesIO(b"broken")),
+            5: make_audio_data(make_silence(1500)),
+        })
+        participants = [Mock(id=1, display_name="山田"), Mock(id=2, display_name="佐藤"),
+                        Mock(id=4, display_name="鈴木"), Mock(id=5, display_name="田中")]
+        monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+
+        speaker_audio = await speaker_analyzer._extract_individual_audio(sink, participants)
+
+        assert list(speaker_audio) == [1]
+        assert len(speaker_audio[1]) == 1500
+        assert list(tmp_path.iterdir()) == [tmp_path / "recordings"]
+
+    @pytest.mark.asyncio
+    async def test_detect_speech_activities_per_user(self, speaker_analyzer):
+        """話者ごとに活動区間を検出し、失敗した話者は空として扱う"""
+        speaker_audio = {
+            1: make_silence(500) + make_tone(1500),
+            2: None,
+        }
+
+        activities = await speaker_analyzer._detect_speech_activities(speaker_audio)
+
+        assert activities == {1: [(0.5, 2.0)], 2: []}
+
+    def test_calculate_statistics(self, speaker_analyzer):
+        """話者ごとの発言時間・回数・単語数と参加率を集計する"""
+        segments = [
+            SpeakerSegment(user_id=1, user_name="山田", start_time=0.0, end_time=6.0, text="始めます。議題は二つです。"),
+            SpeakerSegment(user_id=2, user_name="佐藤", start_time=6.0, end_time=8.0, text="了解です。"),
+            SpeakerSegment(user_id=1, user_name="山田", start_time=8.0, end_time=10.0, text="以上です。"),
+        ]
+
+        statistics = speaker_analyzer._calculate_statistics(segments, [])
+
+        assert [s.user_name for s in statistics] == ["山田", "佐藤"]
+        assert statistics[0].total_duration == 8.0
+        assert statistics[0].segment_count == 2
+        assert statistics[0].word_count == 3
+        assert statistics[0].avg_segment_length == 4.0
+        assert statistics[0].participation_ratio == 80.0
+        assert statistics[1].participation_ratio == 20.0
+
+    @pytest.mark.asyncio
+    async def test_assign_text_to_speakers_splits_sentences(self, speaker_analyzer):
+        """タイムスタンプがない場合は文を発言区間に順番に配分する"""
+        participants = [Mock(id=1, display_name="山田"), Mock(id=2, display_name="佐藤")]
+        activities = {2: [(3.0, 5.0)], 1: [(0.0, 2.0), (6.0, 7.0)], 3: [(1.0, 2.0)]}
+
+        segments = await speaker_analyzer._assign_text_to_speakers(
+            "始めます！進捗は？\n順調です。。以上です", activities, participants
+        )
+
+        assert [(s.user_name, s.text, s.start_time) for s in segments] == [
+            ("山田", "始めます。進捗は。", 0.0),
+            ("佐藤", "順調です。", 3.0),
+            ("山田", "以上です。", 6.0),
+        ]
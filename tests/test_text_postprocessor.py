@@ -0,0 +1,69 @@
+import pytest
+
+from src.text_postprocessor import TextPostProcessor
+
+
+@pytest.fixture
+def postprocessor():
+    """テスト用のTextPostProcessorインスタンス（AI修正なし）"""
+    return TextPostProcessor()
+
+
+class TestTextPostProcessor:
+    def test_basic_cleanup(self, postprocessor):
+        """余分な空白・連続する句読点・短すぎる文を整理する"""
+        text = "  今日は  会議です。。。あ。進捗を、、確認します。 "
+
+        assert postprocessor._basic_cleanup(text) == "今日は 会議です。進捗を、確認します。"
+
+    def test_apply_corrections_prefers_longer_patterns(self, postprocessor):
+        """重なり合う誤りパターンは長い方を優先して1回の走査で置換する"""
+        text = "そう です ね、と いうか これ に ついて です が"
+
+        assert postprocessor._apply_corrections(text) == "そうですね、というか これ について ですが"
+
+    def test_apply_corrections_normalizes_katakana_words(self, postprocessor):
+        """分割されたカタカナ語を正規化する"""
+        text = "デ バッグ して から プル リクエスト を マー ジ"
+
+        assert postprocessor._apply_corrections(text) == "デバッグ して から プルリクエスト を マージ"
+
+    def test_normalize_punctuation(self, postprocessor):
+        """句読点の前後の空白を詰め、感嘆符・疑問符の後に空白を入れる"""
+        text = "はい 。 本当ですか？あとで確認します ！OK"
+
+        assert postprocessor._normalize_punctuation(text) == "はい。本当ですか？ あとで確認します！ OK"
+
+    def test_apply_corrections_fixes_both_tables(self, postprocessor):
+        """一般的なエラーとカタカナ語を1回の走査でまとめて修正する"""
+        text = "データ ベース に ついて と いうか サー バー"
+
+        assert postprocessor._apply_corrections(text) == "データベース について というか サーバー"
+
+    @pytest.mark.asyncio
+    async def test_process_transcription(self, postprocessor):
+        """後処理全体でクリーンアップ・修正・句読点整理を適用する"""
+        text = "今日は デ バッグ に ついて 話します 。 そう です ね 。"
+
+        result = await postprocessor.process_transcription(text, use_ai_correction=False)
+
+        assert result == "今日は デバッグ について 話します。そうですね"
+
+    def test_get_text_statistics(self, postprocessor):
+        """処理前後の文字数・文数を集計する"""
+        stats = postprocessor.get_text_statistics("はい。そうです。", "そうです。")
+
+        assert stats["original_sentences"] == 2
+        assert stats["processed_sentences"] == 1
+        assert stats["improvement_ratio"] == 5 / 8
+
+    @pytest.mark.asyncio
+    async def test_rule_based_pipeline_is_cached(self, postprocessor):
+        """同じ文字起こしの再処理ではルールベースの整形を再実行しない"""
+        text = "今日は デ バッグ に ついて 話します。"
+
+        first = await postprocessor.process_transcription(text, use_ai_correction=False)
+        second = await postprocessor.process_transcription(text, use_ai_correction=False)
+
+        assert first == second
+        assert postprocessor._clean_text.cache_info().hits == 1
@@ -1,33 +1,38 @@
 import pytest
 import asyncio
-from unittest.mock import Mock, patch, AsyncMock
+from unittest.mock import AsyncMock
 from pathlib import Path
-import tempfile
-import os
+
+from openai import OpenAIError
 
 from src.transcriber import Transcriber
 from src.llm_providers import OpenAIProvider
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def transcriber():
-    """テスト用のTranscriberインスタンス"""
+    """テスト用のTranscriberインスタンス（モジュール内で共有するため、状態の変更は各テストで元に戻す）"""
     provider = OpenAIProvider(api_key="test_key_1234567890")
     return Transcriber(provider=provider)
 
 
-@pytest.fixture
-def temp_audio_file():
-    """テスト用の一時音声ファイル"""
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        f.write(b"fake_audio_data")
-        temp_path = f.name
-    
-    yield temp_path
-    
-    # クリーンアップ
-    if os.path.exists(temp_path):
-        os.unlink(temp_path)
+@pytest.fixture(scope="module")
+def temp_audio_file(tmp_path_factory):
+    """テスト用の一時音声ファイル（読み取り専用のためモジュール内で共有、削除はpytestに任せる）"""
+    audio_path = tmp_path_factory.mktemp("audio") / "test.wav"
+    audio_path.write_bytes(b"fake_audio_data")
+    return str(audio_path)
+
+
+@pytest.fixture(scope="module")
+def timestamp_result():
+    """プロバイダーが返すタイムスタンプ付き文字起こし結果（読み取り専用のためモジュール内で共有）"""
+    return {
+        "text": "テスト文字起こし",
+        "segments": [{"start": 0.0, "end": 5.0, "text": "テスト"}],
+        "language": "ja",
+        "duration": 10.0
+    }
 
 
 class TestTranscriber:
@@ -37,33 +42,38 @@ class TestTranscriber:
         transcriber = Transcriber(provider=provider)
         assert transcriber.provider.api_key == "test_key"
     
-    def test_init_without_api_key_raises_error(self):
-        """APIキーなしでのインスタンス作成はエラー"""
-        with patch.dict(os.environ, {}, clear=True):
-            with pytest.raises(ValueError):
-                Transcriber()
+    def test_init_without_api_key_raises_error(self, monkeypatch):
+        """APIキーなしでのインスタンス作成はエラー（環境変数は関係するものだけ削除）"""
+        for name in ("LLM_PROVIDER", "OPENAI_API_KEY", "OPENAI_API_KEYS"):
+            monkeypatch.delenv(name, raising=False)
+        # openai クライアント自体がキー未設定で OpenAIError を送出するバージョンもある
+        with pytest.raises((ValueError, OpenAIError)):
+            Transcriber()
     
-    def test_validate_api_key(self, transcriber):
+    def test_validate_api_key(self, transcriber, monkeypatch):
         """APIキー検証"""
         assert transcriber.validate_api_key() is True
         
         # 短いキーの場合
-        transcriber.provider.api_key = "short"
+        monkeypatch.setattr(transcriber.provider, "api_key", "short")
         assert transcriber.validate_api_key() is False
     
     @pytest.mark.asyncio
-    async def test_transcribe_success(self, transcriber, temp_audio_file):
-        """文字起こし成功ケース"""
-        mock_response = "これはテストの文字起こし結果です。"
+    @pytest.mark.parametrize("mock_response", [
+        "これはテストの文字起こし結果です。",  # 成功
+        "音声の文字起こしでAPIエラーが発生しました: API Error",  # OpenAI APIエラー
+        "音声の文字起こしに失敗しました。",  # 空の文字起こし結果
+    ], ids=["success", "openai_error", "empty_result"])
+    async def test_transcribe(self, transcriber, temp_audio_file, monkeypatch, mock_response):
+        """後処理なしではプロバイダーの結果をそのまま返す"""
+        monkeypatch.setattr(transcriber, 'enable_postprocessing', False)
+        mock_transcribe = AsyncMock(return_value=mock_response)
+        monkeypatch.setattr(transcriber.provider, 'transcribe', mock_transcribe)
+        
+        result = await transcriber.transcribe(temp_audio_file)
         
-        with patch.object(transcriber.provider, 'transcribe',
-                         new_callable=AsyncMock) as mock_transcribe:
-            mock_transcribe.return_value = mock_response
-            
-            result = await transcriber.transcribe(temp_audio_file)
-            
-            assert result == mock_response
-            mock_transcribe.assert_called_once()
+        assert result == mock_response
+        mock_transcribe.assert_called_once()
     
     @pytest.mark.asyncio
     async def test_transcribe_file_not_found(self, transcriber):
@@ -72,52 +82,31 @@ class TestTranscriber:
         assert "音声ファイルが見つかりませんでした" in result
     
     @pytest.mark.asyncio
-    async def test_transcribe_openai_error(self, transcriber, temp_audio_file):
-        """OpenAI APIエラー"""
-        from openai import OpenAIError
-        
-        with patch.object(transcriber.provider, 'transcribe',
-                         new_callable=AsyncMock) as mock_transcribe:
-            mock_transcribe.return_value = "音声の文字起こしでAPIエラーが発生しました: API Error"
-            
-            result = await transcriber.transcribe(temp_audio_file)
-            
-            assert "音声の文字起こしでAPIエラーが発生しました" in result
-    
-    @pytest.mark.asyncio
-    async def test_transcribe_with_timestamps_success(self, transcriber, temp_audio_file):
+    async def test_transcribe_with_timestamps_success(self, transcriber, temp_audio_file,
+                                                      timestamp_result, monkeypatch):
         """タイムスタンプ付き文字起こし成功"""
-        mock_response = Mock()
-        mock_response.text = "テスト文字起こし"
-        mock_response.segments = [{"start": 0.0, "end": 5.0, "text": "テスト"}]
-        mock_response.language = "ja"
-        mock_response.duration = 10.0
+        monkeypatch.setattr(transcriber.provider, 'transcribe_with_timestamps',
+                            AsyncMock(return_value=timestamp_result))
         
-        expected_result = {
-            "text": "テスト文字起こし",
-            "segments": [{"start": 0.0, "end": 5.0, "text": "テスト"}],
-            "language": "ja",
-            "duration": 10.0
-        }
+        result = await transcriber.transcribe_with_timestamps(temp_audio_file)
         
-        with patch.object(transcriber.provider, 'transcribe_with_timestamps',
-                         new_callable=AsyncMock) as mock_transcribe:
-            mock_transcribe.return_value = expected_result
-            
-            result = await transcriber.transcribe_with_timestamps(temp_audio_file)
-            
-            assert result["text"] == "テスト文字起こし"
-            assert result["language"] == "ja"
-            assert result["duration"] == 10.0
-            assert len(result["segments"]) == 1
+        assert result["text"] == "テスト文字起こし"
+        assert result["language"] == "ja"
+        assert result["duration"] == 10.0
+        assert len(result["segments"]) == 1
     
     @pytest.mark.asyncio
-    async def test_transcribe_empty_result(self, transcriber, temp_audio_file):
-        """空の文字起こし結果"""
-        with patch.object(transcriber.provider, 'transcribe',
-                         new_callable=AsyncMock) as mock_transcribe:
-            mock_transcribe.return_value = "音声の文字起こしに失敗しました。"
-            
-            result = await transcriber.transcribe(temp_audio_file)
-            
-            assert result == "音声の文字起こしに失敗しました。"
\ No newline at end of file
+    async def test_transcribe_with_timestamps_postprocesses_text(self, transcriber, temp_audio_file,
+                                                                 timestamp_result, monkeypatch):
+        """全文には後処理を適用し、話者割り当て用のセグメントは元のまま返す"""
+        monkeypatch.setattr(transcriber, 'enable_postprocessing', True)
+        monkeypatch.setattr(transcriber.provider, 'transcribe_with_timestamps',
+                            AsyncMock(return_value=timestamp_result))
+        monkeypatch.setattr(transcriber.postprocessor, 'process_transcription',
+                            AsyncMock(return_value="整形済みの文字起こし"))
+        
+        result = await transcriber.transcribe_with_timestamps(temp_audio_file)
+        
+        assert result["text"] == "整形済みの文字起こし"
+        assert result["segments"] == timestamp_result["segments"]
+        assert timestamp_result["text"] == "テスト文字起こし"
@@ -1,23 +1,23 @@
 import pytest
 import asyncio
-from unittest.mock import Mock, patch, AsyncMock, mock_open
+from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
-import tempfile
 import os
+import io
+import struct
+import threading
+import wave
+from types import SimpleNamespace
 from datetime import datetime, timedelta
 
-from src.voice_recorder import VoiceRecorder
+from src import voice_recorder as voice_recorder_module
+from src.voice_recorder import DiskWaveSink, VoiceRecorder
 
 
 @pytest.fixture
-def temp_dir():
-    """テスト用の一時ディレクトリ"""
-    import tempfile
-    import shutil
-    
-    temp_path = tempfile.mkdtemp()
-    yield temp_path
-    shutil.rmtree(temp_path, ignore_errors=True)
+def temp_dir(tmp_path):
+    """テスト用の一時ディレクトリ（作成・削除はpytestのtmp_pathに任せる）"""
+    return str(tmp_path)
 
 
 @pytest.fixture
@@ -26,35 +26,56 @@ def voice_recorder(temp_dir):
     return VoiceRecorder(output_dir=temp_dir)
 
 
-@pytest.fixture
-def mock_voice_client():
-    """モックのDiscordVoiceClient"""
+@pytest.fixture(scope="module")
+def shared_voice_client():
+    """モックのDiscordVoiceClient（モジュール内で1回だけ作成）"""
     client = Mock()
     client.channel = Mock()
     client.channel.members = [Mock(), Mock()]  # 2人のメンバー
-    client.is_recording.return_value = False
     return client
 
 
 @pytest.fixture
-def mock_sink():
-    """モックの録音Sink"""
-    sink = Mock()
-    sink.audio_data = {}
-    
-    # モック音声データを作成
-    mock_audio_1 = Mock()
-    mock_audio_1.file.getvalue.return_value = b"fake_audio_data_1"
-    
-    mock_audio_2 = Mock()
-    mock_audio_2.file.getvalue.return_value = b"fake_audio_data_2"
-    
-    sink.audio_data = {
-        "user_1": mock_audio_1,
-        "user_2": mock_audio_2
-    }
-    
-    return sink
+def mock_voice_client(shared_voice_client):
+    """テストごとに呼び出し履歴と戻り値・例外をリセットして使う"""
+    shared_voice_client.reset_mock(return_value=True, side_effect=True)
+    shared_voice_client.is_recording.return_value = False
+    return shared_voice_client
+
+
+def make_wav(samples, channels=1, framerate=48000):
+    """16bit PCMのWAVバイト列を作成"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(framerate)
+        wav_file.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+    return buffer.getvalue()
+
+
+def read_samples(path):
+    """WAVファイルのサンプル値を取得"""
+    with wave.open(str(path), 'rb') as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+    return list(struct.unpack(f"<{len(frames) // 2}h", frames))
+
+
+@pytest.fixture(scope="module")
+def shared_sink():
+    """モックの録音Sink（audio_data を読むだけなので SimpleNamespace で作成し、モジュール内で共有）"""
+    return SimpleNamespace(audio_data={
+        "user_1": SimpleNamespace(file=io.BytesIO(b"fake_audio_data_1" * 4)),
+        "user_2": SimpleNamespace(file=io.BytesIO(b"fake_audio_data_2" * 4)),
+    })
+
+
+@pytest.fixture
+def mock_sink(shared_sink):
+    """テストごとに音声データの読み取り位置をリセットして使う"""
+    for audio in shared_sink.audio_data.values():
+        audio.file.seek(0)
+    return shared_sink
 
 
 class TestVoiceRecorder:
@@ -72,7 +93,7 @@ class TestVoiceRecorder:
     @pytest.mark.asyncio
     async def test_start_recording_success(self, voice_recorder, mock_voice_client):
         """録音開始成功ケース"""
-        with patch('discord.sinks.WaveSink') as mock_wave_sink:
+        with patch('src.voice_recorder.DiskWaveSink') as mock_wave_sink:
             mock_sink = Mock()
             mock_wave_sink.return_value = mock_sink
             
@@ -104,6 +125,21 @@ class TestVoiceRecorder:
             mock_voice_client.stop_recording.assert_called_once()
             mock_merge.assert_called_once()
     
+    @pytest.mark.asyncio
+    async def test_stop_recording_resumes_on_finished_callback(self, voice_recorder, mock_voice_client, mock_sink):
+        """録音完了コールバックが呼ばれたらタイムアウトを待たずに保存へ進む"""
+        voice_recorder.sink = mock_sink
+        voice_recorder.recording_finished = asyncio.Event()
+        mock_voice_client.stop_recording.side_effect = lambda: asyncio.get_running_loop().call_later(
+            0.01, voice_recorder.recording_finished.set
+        )
+        
+        with patch.object(voice_recorder, '_merge_audio_files',
+                         new_callable=AsyncMock, return_value="test_output.wav"):
+            result = await asyncio.wait_for(voice_recorder.stop_recording(mock_voice_client), timeout=5)
+        
+        assert result == "test_output.wav"
+    
     @pytest.mark.asyncio
     async def test_stop_recording_exception(self, voice_recorder, mock_voice_client):
         """録音停止時の例外処理"""
@@ -113,23 +149,82 @@ class TestVoiceRecorder:
             await voice_recorder.stop_recording(mock_voice_client)
     
     @pytest.mark.asyncio
-    async def test_merge_audio_files_success(self, voice_recorder, mock_sink):
-        """音声ファイル結合成功ケース"""
-        voice_recorder.sink = mock_sink
+    async def test_merge_audio_files_success(self, voice_recorder):
+        """全ユーザーの音声を重ね合わせ、短い音声は無音として扱い、範囲外はクリップする"""
+        user_1 = Mock()
+        user_1.file = io.BytesIO(make_wav([100, 200, 30000, 4]))
+        user_2 = Mock()
+        user_2.file = io.BytesIO(make_wav([1, -50, 10000]))
+        voice_recorder.sink = Mock(audio_data={"user_1": user_1, "user_2": user_2})
+        
+        result = await voice_recorder._merge_audio_files()
+        
+        assert result.endswith('.wav')
+        assert 'recording_' in result
+        assert read_samples(result) == [101, 150, 32767, 4]
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_clips_only_final_sum(self, voice_recorder):
+        """途中の和が16bitの範囲を超えても、最終的な和だけをクリップする"""
+        users = {}
+        for user_id, samples in [("user_1", [30000, -30000]), ("user_2", [30000, -30000]),
+                                 ("user_3", [-30000, -30000])]:
+            users[user_id] = Mock()
+            users[user_id].file = io.BytesIO(make_wav(samples))
+        voice_recorder.sink = Mock(audio_data=users)
+        
+        result = await voice_recorder._merge_audio_files()
+        
+        assert read_samples(result) == [30000, -32768]
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_in_chunks(self, voice_recorder, monkeypatch):
+        """一定フレーム数ずつ合成しても全体を一度に合成した場合と同じ結果になる"""
+        monkeypatch.setattr("src.voice_recorder.MIX_CHUNK_FRAMES", 2)
+        user_1 = Mock()
+        user_1.file = io.BytesIO(make_wav([1, 2, 3, 4, 5, 6], channels=2))
+        user_2 = Mock()
+        user_2.file = io.BytesIO(make_wav([10, 20, 30, 40], channels=2))
+        voice_recorder.sink = Mock(audio_data={"user_1": user_1, "user_2": user_2})
         
-        # pydub.AudioSegmentのモック
-        mock_audio_segment = Mock()
-        mock_combined = Mock()
-        mock_audio_segment.from_file.return_value = mock_combined
-        mock_combined.overlay.return_value = mock_combined
+        result = await voice_recorder._merge_audio_files()
         
-        with patch('src.voice_recorder.AudioSegment', mock_audio_segment):
-            with patch('builtins.open', mock_open()):
-                result = await voice_recorder._merge_audio_files()
-                
-                assert result.endswith('.wav')
-                assert 'recording_' in result
-                mock_combined.export.assert_called_once()
+        assert read_samples(result) == [11, 22, 33, 44, 5, 6]
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_in_worker_thread(self, voice_recorder):
+        """合成処理はイベントループを塞がないようワーカースレッドで実行する"""
+        user_1 = Mock()
+        user_1.file = io.BytesIO(make_wav([1, 2]))
+        user_2 = Mock()
+        user_2.file = io.BytesIO(make_wav([3, 4]))
+        voice_recorder.sink = Mock(audio_data={"user_1": user_1, "user_2": user_2})
+        threads = []
+        
+        def mix(tracks, output_path):
+            threads.append(threading.current_thread())
+            output_path.write_bytes(b"mixed")
+        
+        with patch('src.voice_recorder._mix_wav_tracks', side_effect=mix):
+            await voice_recorder._merge_audio_files()
+        
+        assert threads and threads[0] is not threading.main_thread()
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_single_user(self, voice_recorder):
+        """音声が1人分だけなら合成せずにそのまま保存する"""
+        raw_audio = make_wav([1, 2, 3])
+        user_1 = Mock()
+        user_1.file = io.BytesIO(raw_audio)
+        empty = Mock()
+        empty.file = io.BytesIO()
+        voice_recorder.sink = Mock(audio_data={"user_1": user_1, "user_2": empty})
+        
+        with patch('src.voice_recorder._mix_wav_tracks') as mock_mix:
+            result = await voice_recorder._merge_audio_files()
+        
+        assert Path(result).read_bytes() == raw_audio
+        mock_mix.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_merge_audio_files_no_data(self, voice_recorder):
@@ -141,17 +236,88 @@ class TestVoiceRecorder:
     
     @pytest.mark.asyncio
     async def test_merge_audio_files_fallback(self, voice_recorder, mock_sink):
-        """結合失敗時のフォールバック"""
+        """結合失敗時のフォールバック（WAVとして読めない場合は最初のユーザーの音声をワーカースレッドで保存）"""
         voice_recorder.sink = mock_sink
+        threads = []
+        save_track = voice_recorder_module._save_track
         
-        with patch('src.voice_recorder.AudioSegment') as mock_audio_segment:
-            mock_audio_segment.from_file.side_effect = Exception("結合エラー")
-            
-            with patch('builtins.open', mock_open()) as mock_file:
-                result = await voice_recorder._merge_audio_files()
-                
-                assert result.endswith('.wav')
-                mock_file.assert_called()
+        def save(track, output_path):
+            threads.append(threading.current_thread())
+            save_track(track, output_path)
+        
+        with patch('src.voice_recorder._save_track', side_effect=save):
+            result = await voice_recorder._merge_audio_files()
+        
+        assert result.endswith('.wav')
+        assert Path(result).read_bytes() == b"fake_audio_data_1" * 4
+        assert threads and threads[-1] is not threading.main_thread()
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_unique_names(self, voice_recorder):
+        """同じ秒に続けて保存しても別のファイル名になる"""
+        user_1 = Mock()
+        user_1.file = io.BytesIO(make_wav([1, 2, 3]))
+        voice_recorder.sink = Mock(audio_data={"user_1": user_1})
+        
+        with patch('time.strftime', return_value="20240101_120000"):
+            first = await voice_recorder._merge_audio_files()
+            second = await voice_recorder._merge_audio_files()
+        
+        assert first != second
+        assert Path(first).exists() and Path(second).exists()
+    
+    @pytest.mark.asyncio
+    async def test_merge_audio_files_header_only(self, voice_recorder):
+        """全員がWAVヘッダーのみ（無音）の場合はファイルを保存せずにエラーにする"""
+        users = {}
+        for user_id in ("user_1", "user_2"):
+            users[user_id] = Mock()
+            users[user_id].file = io.BytesIO(make_wav([]))
+        voice_recorder.sink = Mock(audio_data=users)
+        
+        with pytest.raises(ValueError, match="有効な音声データが見つかりません"):
+            await voice_recorder._merge_audio_files()
+        
+        assert list(voice_recorder.output_dir.iterdir()) == []
+    
+    def test_disk_wave_sink_writes_valid_wav(self):
+        """一時ファイルに書き込んだPCMに、実際のデータ長のWAVヘッダーを付ける"""
+        sink = DiskWaveSink()
+        sink.vc = Mock(recording=False)
+        sink.vc.decoder = Mock(CHANNELS=2, SAMPLE_SIZE=4, SAMPLING_RATE=48000)
+        pcm = struct.pack("<8h", *range(8))
+        
+        sink.write(pcm[:6], "user_1")
+        sink.write(pcm[6:], "user_1")
+        sink.cleanup()
+        
+        audio_file = sink.audio_data["user_1"].file
+        assert not isinstance(audio_file, io.BytesIO)
+        with wave.open(audio_file, 'rb') as wav_file:
+            assert wav_file.getnchannels() == 2
+            assert wav_file.getframerate() == 48000
+            assert wav_file.readframes(wav_file.getnframes()) == pcm
+    
+    def test_disk_wave_sink_pads_late_speaker(self):
+        """録音開始から最初の音声までを無音で埋め、ユーザー間で時間軸を揃える"""
+        sink = DiskWaveSink()
+        vc = Mock(recording=False)
+        vc.decoder = Mock(CHANNELS=2, SAMPLE_SIZE=4, SAMPLING_RATE=48000)
+        pcm = struct.pack("<4h", 1, 2, 3, 4)
+        
+        with patch('src.voice_recorder.time.monotonic', side_effect=[100.0, 100.0, 101.5]):
+            sink.init(vc)
+            sink.write(pcm, "user_1")
+            sink.write(pcm, "user_2")
+        sink.cleanup()
+        
+        lengths = {}
+        for user in ("user_1", "user_2"):
+            with wave.open(sink.audio_data[user].file, 'rb') as wav_file:
+                frames = wav_file.readframes(wav_file.getnframes())
+            lengths[user] = len(frames) // 4
+            assert frames.endswith(pcm) and not frames[:-len(pcm)].strip(b"\0")
+        assert lengths == {"user_1": 2, "user_2": 72000 + 2}
     
     def test_cleanup_old_recordings(self, voice_recorder):
         """古い録音ファイルのクリーンアップ"""